@@ -0,0 +1,19 @@
+"""
+Performance benchmarks for the printing layer.
+
+Run the modules in this package from the `src` directory, e.g.
+`python -m benchmarks.fonts`, or through the `inv bench-*` tasks.
+"""
+
+import os
+
+
+def setup_django(settings_module: str = "pod.settings") -> None:
+    """
+    Configure Django so the benchmarks can render templates in-process.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+
+    import django
+
+    django.setup()
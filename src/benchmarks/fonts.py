@@ -0,0 +1,72 @@
+"""
+Measure the per-render saving of sharing WeasyPrint font configurations.
+
+Renders the example invoice repeatedly, once with a brand new `FontConfiguration` for
+every render (the previous behaviour) and once with the shared pool used by
+`WeasyPrintPDFGenerator`, then reports the timings of both.
+"""
+
+import argparse
+import statistics
+import time
+import typing
+
+from . import setup_django
+
+
+def time_renders(generator_class: type[typing.Any], renders: int) -> list[float]:
+    from django.template import loader
+
+    from pod.examples.views import InvoiceView
+
+    template = loader.get_template(InvoiceView.template_name)
+    context = InvoiceView().get_context_data()
+    context.pop("view")
+
+    timings = []
+    for _ in range(renders):
+        start = time.perf_counter()
+        generator_class(
+            template=template,
+            context=context,
+            # The invoice's `@font-face` rules are in its stylesheet
+            stylesheets=InvoiceView.pdf_stylesheets,
+        ).get_pdf()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label: str, timings: list[float]) -> None:
+    print(
+        f"{label:<8} first: {timings[0] * 1000:8.1f}ms"
+        f"  median: {statistics.median(timings) * 1000:8.1f}ms"
+        f"  mean: {statistics.mean(timings) * 1000:8.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--renders", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from weasyprint.text import fonts
+
+    from pod.printing import generation, pools
+
+    class FreshFontConfigGenerator(generation.WeasyPrintPDFGenerator):
+        def get_font_config_pool(self) -> pools.ObjectPool[fonts.FontConfiguration]:
+            return pools.ObjectPool(fonts.FontConfiguration)
+
+    fresh = time_renders(FreshFontConfigGenerator, args.renders)
+    shared = time_renders(generation.WeasyPrintPDFGenerator, args.renders)
+
+    report("fresh", fresh)
+    report("shared", shared)
+    saving = statistics.median(fresh) - statistics.median(shared)
+    print(f"Median saving per render: {saving * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
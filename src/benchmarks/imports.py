@@ -0,0 +1,95 @@
+"""
+Measure the start-up cost of the project, and check the PDF libraries load lazily.
+
+Times setting up Django and importing the printing package and URLs in a fresh
+interpreter, and how long each PDF library would add if it were imported at start-up.
+Exits with an error if setting up imports any of the PDF libraries, so that management
+commands and workers that never render a PDF do not pay for them.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Libraries that should only be imported when the first PDF is rendered
+LAZY_MODULES = ("weasyprint", "typst", "pypdf")
+
+SETUP_CODE = f"""
+import json, sys, time
+
+start = time.perf_counter()
+from benchmarks import setup_django
+
+setup_django()
+import pod.printing
+import pod.urls
+
+elapsed = time.perf_counter() - start
+loaded = [m for m in {LAZY_MODULES!r} if m in sys.modules]
+json.dump({{"setup_ms": elapsed * 1000, "loaded": loaded}}, sys.stdout)
+"""
+
+
+def run_python(*args: str) -> subprocess.CompletedProcess[str]:
+    return subprocess.run(  # noqa: S603
+        [sys.executable, *args], capture_output=True, text=True
+    )
+
+
+def time_setup() -> tuple[float, list[str]]:
+    """
+    Set up Django in a fresh interpreter, returning the time taken and any of the lazy
+    modules that were imported.
+    """
+    process = run_python("-c", SETUP_CODE)
+    if process.returncode:
+        raise RuntimeError(process.stderr)
+    result = json.loads(process.stdout)
+    return result["setup_ms"], result["loaded"]
+
+
+def time_import(module: str) -> float | None:
+    """
+    Return the cumulative import time of the module in milliseconds, or `None` if it
+    cannot be imported.
+    """
+    process = run_python("-X", "importtime", "-c", f"import {module}")
+    if process.returncode:
+        return None
+    for line in reversed(process.stderr.splitlines()):
+        _, _, timings = line.partition("import time:")
+        fields = [field.strip() for field in timings.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) / 1000
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    timings = []
+    loaded: set[str] = set()
+    for _ in range(args.runs):
+        setup_ms, modules = time_setup()
+        timings.append(setup_ms)
+        loaded.update(modules)
+
+    print(
+        f"{'django setup':<12} median: {statistics.median(timings):8.1f}ms"
+        f"  min: {min(timings):8.1f}ms"
+    )
+    for module in LAZY_MODULES:
+        import_ms = time_import(module)
+        cost = f"{import_ms:8.1f}ms" if import_ms is not None else "unavailable"
+        print(f"{module:<12} import: {cost}")
+
+    if loaded:
+        sys.exit(f"Setting up Django imported {', '.join(sorted(loaded))}")
+
+
+if __name__ == "__main__":
+    main()
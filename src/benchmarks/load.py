@@ -0,0 +1,426 @@
+"""
+Load test the ASGI and WSGI entry points with a mix of PDF and other requests.
+
+Starts `pod.asgi:application` under uvicorn (with uvloop and httptools where available)
+and `pod.wsgi:application` under a threaded WSGI server, and for each runs an asyncio
+load generator at every concurrency level for a fixed duration. Each virtual user sends
+requests back to back, cycling through the paths, on a new connection per request.
+
+For every server and concurrency level the report has the throughput, latency
+percentiles and error rate overall and per path, the number of requests rejected with
+`503`, and the CPU use and peak RSS of every server process. It is written as JSON,
+followed by a side-by-side summary on stderr.
+
+The servers use `benchmarks.settings`, which disables the rendered PDF caches and
+single-flight sharing unless `--cache` is given, so that every PDF request renders.
+Admission control is left on, as it decides which requests are rejected.
+Per-process CPU and RSS are read from `/proc` and are only reported on Linux.
+"""
+
+import argparse
+import asyncio
+import concurrent.futures
+import dataclasses
+import importlib.util
+import itertools
+import json
+import os
+import socket
+import socketserver
+import subprocess
+import sys
+import time
+import typing
+
+from .rendering import get_versions, parse_ints, summarise
+
+HOST = "127.0.0.1"
+SERVERS = ("asgi", "wsgi")
+# The invoice is rendered by WeasyPrint and the ticket by Typst; the admin login page
+# shows how requests that do not render a PDF fare alongside them
+PATHS = ("/invoice/", "/ticket/", "/admin/login/")
+# How often server processes are sampled for CPU and RSS
+SAMPLE_INTERVAL = 0.25
+STARTUP_TIMEOUT = 60
+REQUEST_TIMEOUT = 120
+
+
+@dataclasses.dataclass
+class Result:
+    path: str
+    latency: float
+    status: int | None = None
+
+    @property
+    def failed(self) -> bool:
+        return self.status is None or self.status >= 400
+
+
+async def request(port: int, path: str) -> int:
+    """
+    Make a GET request on a new connection, read the whole response and return its
+    status code.
+    """
+    reader, writer = await asyncio.open_connection(HOST, port)
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {HOST}:{port}\r\n"
+            "Connection: close\r\n\r\n".encode("ascii")
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        # The server closes the connection once the response is complete
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+async def virtual_user(
+    port: int, paths: typing.Sequence[str], offset: int, deadline: float
+) -> list[Result]:
+    results = []
+    # Start each user at a different path so every path is requested at once
+    for path in itertools.islice(itertools.cycle(paths), offset % len(paths), None):
+        if time.perf_counter() >= deadline:
+            break
+        start = time.perf_counter()
+        try:
+            status: int | None = await asyncio.wait_for(
+                request(port, path), REQUEST_TIMEOUT
+            )
+        except (OSError, ValueError, IndexError, TimeoutError):
+            status = None
+        results.append(Result(path, time.perf_counter() - start, status))
+    return results
+
+
+async def generate_load(
+    port: int, paths: typing.Sequence[str], concurrency: int, duration: float
+) -> tuple[list[Result], float]:
+    """
+    Run `concurrency` virtual users for `duration` seconds, returning every result and
+    the time taken.
+    """
+    start = time.perf_counter()
+    deadline = start + duration
+    per_user = await asyncio.gather(
+        *(virtual_user(port, paths, i, deadline) for i in range(concurrency))
+    )
+    return [result for results in per_user for result in results], (
+        time.perf_counter() - start
+    )
+
+
+def get_process_tree(pid: int) -> list[int]:
+    """
+    Return the process and all of its descendants.
+    """
+    pids = [pid]
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return pids
+    for task in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children = [int(child) for child in f.read().split()]
+        except OSError:
+            continue
+        for child in children:
+            pids.extend(get_process_tree(child))
+    return pids
+
+
+def read_cpu_seconds(pid: int) -> float | None:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rpartition(")")[2].split()
+    except OSError:
+        return None
+    # utime and stime, the 14th and 15th fields counting the pid and name
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def read_rss(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ProcessSampler:
+    """
+    Samples the CPU time and RSS of a server's processes while the load runs.
+    """
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.cpu_start: dict[int, float] = {}
+        self.cpu_end: dict[int, float] = {}
+        self.peak_rss: dict[int, int] = {}
+
+    def sample(self, cpu: dict[int, float]) -> None:
+        for pid in get_process_tree(self.pid):
+            seconds = read_cpu_seconds(pid)
+            if seconds is not None:
+                cpu[pid] = seconds
+            rss = read_rss(pid)
+            if rss is not None:
+                self.peak_rss[pid] = max(self.peak_rss.get(pid, 0), rss)
+
+    async def run(self, stop: asyncio.Event) -> None:
+        self.sample(self.cpu_start)
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), SAMPLE_INTERVAL)
+            except TimeoutError:
+                self.sample(self.cpu_end)
+        self.sample(self.cpu_end)
+
+    def report(self, elapsed: float) -> list[dict[str, typing.Any]]:
+        return [
+            {
+                "pid": pid,
+                "role": "main" if pid == self.pid else "worker",
+                "cpu_percent": (cpu - self.cpu_start.get(pid, 0.0)) / elapsed * 100,
+                "peak_rss_bytes": self.peak_rss.get(pid),
+            }
+            for pid, cpu in sorted(self.cpu_end.items())
+        ]
+
+
+def summarise_results(results: list[Result], elapsed: float) -> dict[str, typing.Any]:
+    failed = sum(result.failed for result in results)
+    return {
+        "requests": len(results),
+        "throughput_per_s": len(results) / elapsed,
+        "error_rate": failed / len(results) if results else 0.0,
+        "rejected": sum(result.status == 503 for result in results),
+        "latency_ms": summarise([result.latency for result in results]),
+    }
+
+
+async def run_scenario(
+    server: subprocess.Popen[bytes],
+    port: int,
+    paths: typing.Sequence[str],
+    concurrency: int,
+    duration: float,
+) -> dict[str, typing.Any]:
+    sampler = ProcessSampler(server.pid)
+    stop = asyncio.Event()
+    sampling = asyncio.create_task(sampler.run(stop))
+    results, elapsed = await generate_load(port, paths, concurrency, duration)
+    stop.set()
+    await sampling
+
+    return {
+        "concurrency": concurrency,
+        **summarise_results(results, elapsed),
+        "paths": {
+            path: summarise_results([r for r in results if r.path == path], elapsed)
+            for path in paths
+        },
+        "processes": sampler.report(elapsed),
+    }
+
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind((HOST, 0))
+        return int(s.getsockname()[1])
+
+
+def start_server(
+    kind: str, port: int, workers: int, threads: int, cache: bool
+) -> subprocess.Popen[bytes]:
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": "benchmarks.settings",
+        "POD_BENCH_CACHE": "1" if cache else "",
+        # The report counts the requests rejected by admission control
+        "POD_BENCH_ADMISSION": "1",
+    }
+    if kind == "asgi":
+        command = [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "pod.asgi:application",
+            f"--host={HOST}",
+            f"--port={port}",
+            f"--workers={workers}",
+            "--log-level=warning",
+            "--no-access-log",
+        ]
+        if importlib.util.find_spec("uvloop") is not None:
+            command.append("--loop=uvloop")
+        if importlib.util.find_spec("httptools") is not None:
+            command.append("--http=httptools")
+    else:
+        command = [
+            sys.executable,
+            "-m",
+            "benchmarks.load",
+            "--serve-wsgi",
+            f"--port={port}",
+            f"--threads={threads}",
+        ]
+    return subprocess.Popen(command, env=env)  # noqa: S603
+
+
+async def wait_until_ready(
+    server: subprocess.Popen[bytes], port: int, path: str
+) -> None:
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"The server exited with {server.returncode}")
+        try:
+            await request(port, path)
+            return
+        except (OSError, ValueError, IndexError):
+            await asyncio.sleep(0.1)
+    raise RuntimeError("The server did not start in time")
+
+
+def stop_server(server: subprocess.Popen[bytes]) -> None:
+    server.terminate()
+    try:
+        server.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        server.kill()
+        server.wait()
+
+
+async def run_server(
+    kind: str, args: argparse.Namespace, paths: typing.Sequence[str]
+) -> list[dict[str, typing.Any]]:
+    port = get_free_port()
+    server = start_server(kind, port, args.workers, args.threads, args.cache)
+    try:
+        await wait_until_ready(server, port, paths[-1])
+        # Give every worker a chance to import and compile its templates before
+        # measuring
+        for _ in range(args.warmup_requests):
+            await asyncio.gather(
+                *(request(port, path) for path in paths for _ in range(args.workers))
+            )
+
+        runs = []
+        for concurrency in args.concurrency:
+            print(f"{kind} concurrency={concurrency}", file=sys.stderr)
+            run = await run_scenario(server, port, paths, concurrency, args.duration)
+            runs.append({"server": kind, **run})
+        return runs
+    finally:
+        stop_server(server)
+
+
+def print_comparison(runs: list[dict[str, typing.Any]]) -> None:
+    """
+    Print the throughput, p95 latency and error rate of each server side by side.
+    """
+    servers = sorted({run["server"] for run in runs})
+    by_key = {(run["server"], run["concurrency"]): run for run in runs}
+    header = f"{'concurrency':>11}" + "".join(
+        f" | {server + ' req/s':>11} {'p95 ms':>9} {'errors':>7}" for server in servers
+    )
+    print(header, file=sys.stderr)
+    print("-" * len(header), file=sys.stderr)
+    for concurrency in sorted({run["concurrency"] for run in runs}):
+        row = f"{concurrency:>11}"
+        for server in servers:
+            run = by_key.get((server, concurrency))
+            if run is None or run["latency_ms"] is None:
+                row += f" | {'-':>11} {'-':>9} {'-':>7}"
+                continue
+            row += (
+                f" | {run['throughput_per_s']:>11.1f} {run['latency_ms']['p95']:>9.1f}"
+                f" {run['error_rate']:>7.1%}"
+            )
+        print(row, file=sys.stderr)
+
+
+class ThreadPoolWSGIServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    A WSGI server handling each connection on a bounded pool of threads.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, *args: typing.Any, threads: int, **kwargs: typing.Any) -> None:
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+        super().__init__(*args, **kwargs)
+
+    def process_request(self, request: typing.Any, client_address: typing.Any) -> None:
+        self.executor.submit(self.process_request_thread, request, client_address)
+
+
+def serve_wsgi(port: int, threads: int) -> None:
+    """
+    Serve `pod.wsgi:application` on a pool of `threads` threads until terminated.
+    """
+    from django.core.servers import basehttp
+
+    from pod.wsgi import application
+
+    class QuietRequestHandler(basehttp.WSGIRequestHandler):
+        def log_message(self, format: str, *args: typing.Any) -> None:  # noqa: A002
+            pass
+
+    class Server(ThreadPoolWSGIServer, basehttp.WSGIServer):
+        pass
+
+    server = Server((HOST, port), QuietRequestHandler, threads=threads)
+    server.set_app(application)
+    server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--servers", default=",".join(SERVERS))
+    parser.add_argument("--paths", default=",".join(PATHS))
+    parser.add_argument("--concurrency", type=parse_ints, default="1,4,16,64")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--threads", type=int, default=8, help="WSGI threads")
+    parser.add_argument("--warmup-requests", type=int, default=3)
+    parser.add_argument("--cache", action="store_true")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--serve-wsgi", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve_wsgi:
+        serve_wsgi(args.port, args.threads)
+        return
+
+    paths = [path for path in args.paths.split(",") if path]
+    runs = []
+    for kind in (server for server in args.servers.split(",") if server):
+        if kind not in SERVERS:
+            parser.error(f"Unknown server {kind!r}")
+        runs.extend(asyncio.run(run_server(kind, args, paths)))
+
+    report = {
+        "versions": get_versions(),
+        "cache": args.cache,
+        "duration": args.duration,
+        "workers": args.workers,
+        "threads": args.threads,
+        "runs": runs,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    print_comparison(runs)
+
+
+if __name__ == "__main__":
+    main()
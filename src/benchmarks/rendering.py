@@ -0,0 +1,268 @@
+"""
+Benchmark rendering the example PDF views in-process.
+
+Drives `InvoiceView` (WeasyPrint) and `TicketView` (Typst) through Django's request
+handling without a server, and reports the results as JSON:
+
+- cold starts: a fresh interpreter per run, timing Django setup and the first render;
+- warm renders: every combination of line item count and concurrency, reporting
+  p50/p95/p99 latency, throughput, peak RSS and PDF size.
+
+The invoice lists one row per line item. The ticket has a fixed layout, so for it the
+line items only grow the context that is encoded and handed to Typst.
+
+Django is set up with `benchmarks.settings`, so startup warm-up and admission control
+are off, and rendered PDF caches and single-flight sharing are bypassed unless `--cache`
+is given, so that warm renders measure rendering rather than cache hits or renders
+shared between threads.
+"""
+
+import argparse
+import importlib.metadata
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import typing
+from concurrent import futures
+
+from . import setup_django
+
+VIEWS = ("invoice", "ticket")
+# How often the RSS is sampled while a scenario runs
+RSS_SAMPLE_INTERVAL = 0.01
+
+
+def make_items(count: int) -> list[dict[str, typing.Any]]:
+    """
+    Build `count` synthetic invoice line items.
+    """
+    return [
+        {
+            "description": f"Line item {i + 1}",
+            "price": f"${(i % 100) + 0.5:.2f}",
+            "quantity": (i % 10) + 1,
+            "subtotal": f"${((i % 100) + 0.5) * ((i % 10) + 1):,.2f}",
+        }
+        for i in range(count)
+    ]
+
+
+def get_view(name: str, items: int) -> typing.Callable[..., typing.Any]:
+    """
+    Return the view function for `name`, rendering `items` line items.
+    """
+    from pod.examples import views
+
+    view_class: type[typing.Any] = {
+        "invoice": views.InvoiceView,
+        "ticket": views.TicketView,
+    }[name]
+    line_items = make_items(items)
+
+    class BenchmarkView(view_class):  # type: ignore[misc]
+        def get_context_data(self, **kwargs: typing.Any) -> dict[str, typing.Any]:
+            context = super().get_context_data(**kwargs)
+            context["items"] = line_items
+            return typing.cast(dict[str, typing.Any], context)
+
+    return typing.cast(typing.Callable[..., typing.Any], BenchmarkView.as_view())
+
+
+def render(view: typing.Callable[..., typing.Any]) -> tuple[float, int]:
+    """
+    Make one request to the view, returning the latency and the PDF size.
+    """
+    from django.test import RequestFactory
+
+    request = RequestFactory().get("/")
+    start = time.perf_counter()
+    response = view(request)
+    response.render()
+    size = len(response.content)
+    return time.perf_counter() - start, size
+
+
+class RSSSampler:
+    """
+    Records the peak RSS of the process while it is in use as a context manager.
+    """
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        from pod.printing import memory
+
+        while True:
+            self.peak = max(self.peak, memory.get_rss() or 0)
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self) -> "RSSSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def summarise(timings: list[float]) -> dict[str, float] | None:
+    """
+    Return the latency percentiles of the timings in milliseconds, or `None` if there
+    are too few timings for percentiles.
+    """
+    if len(timings) < 2:
+        return None
+    percentiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "min": min(timings) * 1000,
+        "p50": percentiles[49] * 1000,
+        "p95": percentiles[94] * 1000,
+        "p99": percentiles[98] * 1000,
+        "max": max(timings) * 1000,
+    }
+
+
+def run_warm(
+    name: str, items: int, concurrency: int, renders: int
+) -> dict[str, typing.Any]:
+    """
+    Render the view `renders` times across `concurrency` threads after a warm-up render.
+    """
+    view = get_view(name, items)
+    render(view)
+
+    with RSSSampler() as sampler:
+        start = time.perf_counter()
+        with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda _: render(view), range(renders)))
+        elapsed = time.perf_counter() - start
+
+    timings = [timing for timing, _ in results]
+    return {
+        "view": name,
+        "items": items,
+        "concurrency": concurrency,
+        "renders": renders,
+        "latency_ms": summarise(timings),
+        "throughput_per_s": renders / elapsed,
+        "peak_rss_bytes": sampler.peak,
+        "pdf_bytes": results[-1][1],
+    }
+
+
+def run_cold(name: str) -> dict[str, typing.Any]:
+    """
+    Render the view once in a fresh interpreter, which inherits the settings.
+    """
+    command = [sys.executable, "-m", "benchmarks.rendering", "--cold-child", name]
+
+    start = time.perf_counter()
+    output = subprocess.run(  # noqa: S603
+        command, check=True, capture_output=True, text=True
+    ).stdout
+    elapsed = time.perf_counter() - start
+
+    result: dict[str, typing.Any] = json.loads(output)
+    result["process_ms"] = elapsed * 1000
+    return result
+
+
+def cold_child(name: str) -> None:
+    """
+    The body of a cold start run: set up Django, render once and print the timings.
+    """
+    start = time.perf_counter()
+    setup_django("benchmarks.settings")
+    view = get_view(name, 1)
+    setup = time.perf_counter() - start
+
+    from pod.printing import memory
+
+    first_render, size = render(view)
+    json.dump(
+        {
+            "view": name,
+            "setup_ms": setup * 1000,
+            "first_render_ms": first_render * 1000,
+            "rss_bytes": memory.get_rss(),
+            "pdf_bytes": size,
+        },
+        sys.stdout,
+    )
+
+
+def get_versions() -> dict[str, str | None]:
+    versions: dict[str, str | None] = {"python": platform.python_version()}
+    for package in ("django", "weasyprint", "typst"):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+
+def parse_ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--views", default=",".join(VIEWS))
+    parser.add_argument("--items", type=parse_ints, default="1,10,100,1000,10000")
+    parser.add_argument("--concurrency", type=parse_ints, default="1,4")
+    parser.add_argument("--renders", type=int, default=10)
+    parser.add_argument("--cold-runs", type=int, default=3)
+    parser.add_argument("--cache", action="store_true")
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    parser.add_argument("--cold-child", choices=VIEWS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.cache:
+        os.environ["POD_BENCH_CACHE"] = "1"
+    if args.cold_child:
+        cold_child(args.cold_child)
+        return
+
+    views = [view for view in args.views.split(",") if view]
+    report: dict[str, typing.Any] = {
+        "versions": get_versions(),
+        "cache": args.cache,
+        "cold": [],
+        "warm": [],
+    }
+
+    for name in views:
+        for _ in range(args.cold_runs):
+            print(f"cold {name}", file=sys.stderr)
+            report["cold"].append(run_cold(name))
+
+    setup_django("benchmarks.settings")
+    for name in views:
+        for items in args.items:
+            for concurrency in args.concurrency:
+                print(
+                    f"warm {name} items={items} concurrency={concurrency}",
+                    file=sys.stderr,
+                )
+                report["warm"].append(run_warm(name, items, concurrency, args.renders))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+Settings for the benchmarks and the servers started by the load test.
+
+The project's settings, with debugging, per-request logging and startup warm-up turned
+off. Rendered PDF caches and single-flight sharing are disabled unless `POD_BENCH_CACHE`
+is set, so that every request renders its document. Admission control is disabled
+unless `POD_BENCH_ADMISSION` is set, so that renders are not queued or rejected.
+"""
+
+import os
+
+from pod.settings import *  # noqa: F403
+
+DEBUG = False
+PDF_RENDER_TIMING = None
+PDF_WARMUP = {"ON_STARTUP": False}
+LOGGING["loggers"] = {  # noqa: F405
+    "report": {"handlers": ["console"], "level": "WARNING", "propagate": False}
+}
+
+if not os.environ.get("POD_BENCH_CACHE"):
+    # Views refer to the "default" cache, so it is kept but cannot hold anything
+    PDF_CACHES = {
+        "default": {"MAX_MEMORY_ITEMS": 0, "MAX_MEMORY_BYTES": 0, "DIRECTORY": None}
+    }
+    PDF_SINGLE_FLIGHT = None  # type: ignore[assignment]
+
+if not os.environ.get("POD_BENCH_ADMISSION"):
+    PDF_ADMISSION = {}
@@ -9,6 +9,10 @@ class InvoiceView(views.PDFTemplateView):
     pdf_filename = "invoice.pdf"
     template_name = "invoice/invoice.html"
     pdf_attachment = False
+    pdf_cache = "default"
+    pdf_stylesheets = ["invoice.css"]
+    # Lay long invoices out a chunk of line items at a time
+    pdf_chunk_rows = "items"
 
     def get_context_data(self, **kwargs: typing.Any) -> dict[str, typing.Any]:
         context = super().get_context_data(**kwargs)
@@ -1,3 +1,17 @@
-from .views import PDFDetailView, PDFTemplateView
+from .views import (
+    AsyncPDFDetailView,
+    AsyncPDFTemplateView,
+    AsyncTemplateView,
+    PDFDetailView,
+    PDFListView,
+    PDFTemplateView,
+)
 
-__all__ = ["PDFDetailView", "PDFTemplateView"]
+__all__ = [
+    "AsyncPDFDetailView",
+    "AsyncPDFTemplateView",
+    "AsyncTemplateView",
+    "PDFDetailView",
+    "PDFListView",
+    "PDFTemplateView",
+]
@@ -0,0 +1,10 @@
+from django.contrib import admin
+
+from .models import RenderJob
+
+
+@admin.register(RenderJob)
+class RenderJobAdmin(admin.ModelAdmin[RenderJob]):
+    list_display = ["id", "template_name", "status", "created_at", "finished_at"]
+    list_filter = ["status"]
+    readonly_fields = ["status", "error", "created_at", "started_at", "finished_at"]
@@ -0,0 +1,190 @@
+"""
+Admission control for PDF renders.
+
+Renders are CPU and memory heavy, so a burst of them can slow down every other page
+the process serves. Each render engine can be given a limit on the number of renders it
+runs at once, with a bounded queue of renders waiting for a slot, using the
+`PDF_ADMISSION` setting:
+
+    PDF_ADMISSION = {
+        "weasyprint": {
+            "MAX_CONCURRENT": 4,
+            "MAX_QUEUE": 16,  # renders waiting for a slot before rejecting more
+            "TIMEOUT": 30,  # seconds to wait for a slot, None to wait forever
+            "RETRY_AFTER": 10,  # seconds, sent in the Retry-After header
+        },
+        "typst": {"MAX_CONCURRENT": 8, "MAX_QUEUE": 32},
+    }
+
+WeasyPrint views use the "weasyprint" limiter and Typst templates the "typst" one.
+PDF views can use another entry, or opt out, with `pdf_admission`, and the Typst engine
+with its `admission` option. Engines without an entry are not limited.
+
+A render that finds the queue full, or waits longer than `TIMEOUT`, raises
+`RenderRejected`. `RenderAdmissionMiddleware` turns that into a `503 Service
+Unavailable` response with a `Retry-After` header. Renders wait on the thread rendering
+them, which for async views is a thread of the render executor. Cached PDFs are served
+without taking a slot.
+"""
+
+import contextlib
+import functools
+import logging
+import threading
+import typing
+
+from django import http
+from django.conf import settings
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger("report")
+
+
+class RenderRejected(Exception):
+    """
+    A render was not admitted because its engine is at capacity.
+    """
+
+    def __init__(self, limiter: str, retry_after: int) -> None:
+        super().__init__(f"The {limiter} render queue is full")
+        self.limiter = limiter
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """
+    Limits the renders running at once, queueing a bounded number of others.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_concurrent: int,
+        max_queue: int = 0,
+        timeout: float | None = None,
+        retry_after: int = 5,
+    ) -> None:
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+
+        self.active = 0
+        self.waiting = 0
+        self._condition = threading.Condition()
+
+    def is_full(self) -> bool:
+        """
+        Return whether another render would be rejected right now.
+        """
+        with self._condition:
+            return self.active >= self.max_concurrent and self.waiting >= self.max_queue
+
+    def acquire(self) -> None:
+        """
+        Take a render slot, waiting in the queue if needed.
+
+        Raises `RenderRejected` if the queue is full or no slot frees up in time.
+        """
+        with self._condition:
+            if self.active < self.max_concurrent and not self.waiting:
+                self.active += 1
+                return
+            if self.waiting >= self.max_queue:
+                raise self.reject("queue full")
+
+            self.waiting += 1
+            try:
+                admitted = self._condition.wait_for(
+                    lambda: self.active < self.max_concurrent, self.timeout
+                )
+            finally:
+                self.waiting -= 1
+            if not admitted:
+                raise self.reject("timed out waiting")
+            self.active += 1
+
+    def release(self) -> None:
+        with self._condition:
+            self.active -= 1
+            self._condition.notify()
+
+    @contextlib.contextmanager
+    def slot(self) -> typing.Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def reject(self, reason: str) -> RenderRejected:
+        logger.warning(
+            "Rejected %s render, %s: %d rendering, %d waiting",
+            self.name,
+            reason,
+            self.active,
+            self.waiting,
+            extra={"pdf_limiter": self.name},
+        )
+        return RenderRejected(self.name, self.retry_after)
+
+
+@functools.lru_cache(maxsize=None)
+def get_limiter(name: str) -> Limiter | None:
+    """
+    Return the process-wide limiter for the `PDF_ADMISSION` entry, or `None` if there
+    is no such entry.
+    """
+    config = getattr(settings, "PDF_ADMISSION", {}).get(name)
+    if config is None:
+        return None
+    return Limiter(
+        name,
+        max_concurrent=config["MAX_CONCURRENT"],
+        max_queue=config.get("MAX_QUEUE", 0),
+        timeout=config.get("TIMEOUT"),
+        retry_after=config.get("RETRY_AFTER", 5),
+    )
+
+
+def admit(name: str | None) -> typing.ContextManager[None]:
+    """
+    Hold a slot of the named limiter for the enclosed render.
+    """
+    limiter = get_limiter(name) if name else None
+    if limiter is None:
+        return contextlib.nullcontext()
+    return limiter.slot()
+
+
+def check(name: str | None) -> None:
+    """
+    Raise `RenderRejected` if the named limiter would reject a render right now.
+    """
+    limiter = get_limiter(name) if name else None
+    if limiter is not None and limiter.is_full():
+        raise limiter.reject("queue full")
+
+
+def rejected_response(exception: RenderRejected) -> http.HttpResponse:
+    response = http.HttpResponse(
+        "Too many documents are being rendered, please try again shortly.",
+        content_type="text/plain",
+        status=503,
+    )
+    response.headers["Retry-After"] = str(exception.retry_after)
+    return response
+
+
+class RenderAdmissionMiddleware(MiddlewareMixin):
+    """
+    Responds to renders that were not admitted with `503 Service Unavailable`.
+    """
+
+    def process_exception(
+        self, request: http.HttpRequest, exception: Exception
+    ) -> http.HttpResponse | None:
+        if isinstance(exception, RenderRejected):
+            return rejected_response(exception)
+        return None
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class PrintingConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "pod.printing"
+
+    def ready(self) -> None:
+        if getattr(settings, "PDF_WARMUP", {}).get("ON_STARTUP"):
+            from . import warmup
+
+            if warmup.is_server_process():
+                warmup.warm_up()
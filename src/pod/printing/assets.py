@@ -0,0 +1,307 @@
+"""
+Serving the images, fonts and stylesheets of WeasyPrint documents from memory.
+
+WeasyPrint resolves every URL in a document against the template's directory and
+fetches it with its default URL fetcher, which reads local files from disk on every
+render and will happily make HTTP requests. `AssetFetcher` replaces it: local files are
+read once into a size-bounded, process-wide cache, `STATIC_URL` and `MEDIA_URL` URLs are
+served from the static files finders and `MEDIA_ROOT` without going over HTTP, and every
+other URL is refused. It is configured with the `PDF_ASSETS` setting:
+
+    PDF_ASSETS = {
+        "MAX_BYTES": 64 * 1024 * 1024,  # the total size of the assets read into memory
+        "MMAP_THRESHOLD": 1024 * 1024,  # memory-map files this large, None to never
+        "ROOTS": [BASE_DIR / "assets"],  # directories assets may be read from
+        "STATIC": True,  # serve STATIC_URL from the static files finders
+        "MEDIA": True,  # serve MEDIA_URL from MEDIA_ROOT
+        "ALLOW_NETWORK": False,  # fetch other http(s) URLs over the network
+        "CHECK_MTIME": DEBUG,  # re-read assets whose files have changed
+    }
+
+Assets may only be read from the template directories of the configured template
+engines and the `ROOTS`; `data:` URLs are always allowed. Memory-mapped assets are kept
+in the operating system's page cache rather than the process's heap, so worker processes
+share them, and they do not count towards `MAX_BYTES`. They are handed to WeasyPrint as
+files reading from the mapping; WeasyPrint still reads each asset into memory while it
+lays out a document. Without `PDF_ASSETS`, WeasyPrint's default URL fetcher is used.
+"""
+
+import collections
+import functools
+import io
+import mimetypes
+import mmap
+import os
+import pathlib
+import threading
+import typing
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.template import engines
+
+from . import memory
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MMAP_THRESHOLD = 1024 * 1024
+
+FetchResult = dict[str, typing.Any]
+URLFetcher = typing.Callable[..., FetchResult]
+
+
+class AssetNotAllowed(ValueError):
+    """
+    A document referred to an asset outside the allowed roots, or on the network.
+    """
+
+
+class MappedFile(io.RawIOBase):
+    """
+    A read-only file over a memory-mapped asset, which leaves the mapping open when it
+    is closed.
+    """
+
+    def __init__(self, data: mmap.mmap) -> None:
+        super().__init__()
+        self._view = memoryview(data)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: typing.Any) -> int:
+        chunk = self._view[self._position : self._position + len(buffer)]
+        memoryview(buffer).cast("B")[: len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def readall(self) -> bytes:
+        data = self._view[self._position :].tobytes()
+        self._position = len(self._view)
+        return data
+
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class AssetCache:
+    """
+    A least recently used cache of file contents, bounded by their total size.
+
+    Files of at least `mmap_threshold` bytes are memory-mapped rather than read. Mapped
+    files are not in the heap, so they are kept outside of the size bound; there are
+    only as many of them as there are large files in the asset roots.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        mmap_threshold: int | None = DEFAULT_MMAP_THRESHOLD,
+        check_mtime: bool = False,
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.mmap_threshold = mmap_threshold
+        self.check_mtime = check_mtime
+
+        self._assets: collections.OrderedDict[str, tuple[bytes, int | None]] = (
+            collections.OrderedDict()
+        )
+        self._mapped: dict[str, tuple[mmap.mmap, int | None]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: str) -> bytes | mmap.mmap:
+        """
+        Return the contents of the file, or its mapping if it is memory-mapped.
+        """
+        mtime = os.stat(path).st_mtime_ns if self.check_mtime else None
+        with self._lock:
+            cached = self._mapped.get(path) or self._assets.get(path)
+            if cached is not None and cached[1] == mtime:
+                if path in self._assets:
+                    self._assets.move_to_end(path)
+                return cached[0]
+
+        data = self.load(path)
+        self.set(path, data, mtime)
+        return data
+
+    def load(self, path: str) -> bytes | mmap.mmap:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if self.mmap_threshold is not None and size >= self.mmap_threshold:
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return f.read()
+
+    def set(self, path: str, data: bytes | mmap.mmap, mtime: int | None) -> None:
+        with self._lock:
+            self._mapped.pop(path, None)
+            previous = self._assets.pop(path, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+
+            if isinstance(data, mmap.mmap):
+                self._mapped[path] = (data, mtime)
+            elif len(data) <= self.max_bytes:
+                self._assets[path] = (data, mtime)
+                self._bytes += len(data)
+                while self._bytes > self.max_bytes:
+                    _, (evicted, _) = self._assets.popitem(last=False)
+                    self._bytes -= len(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._assets.clear()
+            self._mapped.clear()
+            self._bytes = 0
+
+
+class AssetFetcher:
+    """
+    A WeasyPrint URL fetcher serving local, static and media files from an
+    `AssetCache`.
+    """
+
+    def __init__(
+        self,
+        asset_cache: AssetCache,
+        roots: typing.Iterable[str | os.PathLike[str]] = (),
+        static: bool = True,
+        media: bool = True,
+        allow_network: bool = False,
+    ) -> None:
+        self.cache = asset_cache
+        self.roots = tuple(os.path.realpath(root) for root in roots)
+        self.static = static
+        self.media = media
+        self.allow_network = allow_network
+
+    def __call__(
+        self, url: str, *args: typing.Any, **kwargs: typing.Any
+    ) -> FetchResult:
+        scheme = urllib.parse.urlsplit(url).scheme
+        if scheme == "data":
+            return self.fetch_remote(url, *args, **kwargs)
+
+        path = self.resolve(url)
+        if path is None:
+            if scheme in ("http", "https") and self.allow_network:
+                return self.fetch_remote(url, *args, **kwargs)
+            raise AssetNotAllowed(f"Not fetching {url}: it is not a local asset")
+
+        result: FetchResult = {
+            "mime_type": mimetypes.guess_type(path)[0],
+            "redirected_url": url,
+            "filename": os.path.basename(path),
+        }
+        data = self.cache.get(path)
+        if isinstance(data, mmap.mmap):
+            # WeasyPrint closes the files it is given once it has read them
+            result["file_obj"] = MappedFile(data)
+        else:
+            result["string"] = data
+        return result
+
+    def resolve(self, url: str) -> str | None:
+        """
+        Return the path of the file the URL refers to, or `None` if it is not local.
+
+        Raises `AssetNotAllowed` for files outside the allowed roots.
+        """
+        parts = urllib.parse.urlsplit(url)
+        # Root-relative URLs are resolved against the template directory as file URLs,
+        # so static and media URLs are matched on their path.
+        location = urllib.parse.unquote(parts.path) if parts.scheme == "file" else url
+
+        path = self.resolve_static(location) or self.resolve_media(location)
+        if path is not None:
+            return path
+        if parts.scheme != "file":
+            return None
+
+        path = os.path.realpath(urllib.request.url2pathname(parts.path))
+        if not any(
+            path == root or path.startswith(root + os.sep) for root in self.roots
+        ):
+            raise AssetNotAllowed(f"Not fetching {url}: it is outside the asset roots")
+        return path
+
+    def resolve_static(self, location: str) -> str | None:
+        prefix = settings.STATIC_URL
+        if not self.static or not prefix or not location.startswith(prefix):
+            return None
+        return find_static(location.removeprefix(prefix))
+
+    def resolve_media(self, location: str) -> str | None:
+        prefix = settings.MEDIA_URL
+        if (
+            not self.media
+            or not settings.MEDIA_ROOT
+            or not prefix
+            or not location.startswith(prefix)
+        ):
+            return None
+        media_root = os.path.realpath(settings.MEDIA_ROOT)
+        path = os.path.realpath(os.path.join(media_root, location.removeprefix(prefix)))
+        if not path.startswith(media_root + os.sep):
+            raise AssetNotAllowed(f"Not fetching {location}: it is outside MEDIA_ROOT")
+        return path
+
+    def fetch_remote(
+        self, url: str, *args: typing.Any, **kwargs: typing.Any
+    ) -> FetchResult:
+        from weasyprint import urls
+
+        return typing.cast(FetchResult, urls.default_url_fetcher(url, *args, **kwargs))
+
+
+@functools.lru_cache(maxsize=1024)
+def find_static(path: str) -> str | None:
+    """
+    Return the file serving the static file at `path`, or `None` if there is none.
+    """
+    from django.contrib.staticfiles import finders
+
+    if settings.STATIC_ROOT:
+        collected = pathlib.Path(settings.STATIC_ROOT) / path
+        if collected.is_file():
+            return str(collected)
+    return finders.find(path)
+
+
+def get_template_dirs() -> list[pathlib.Path]:
+    """
+    Return the template directories of every configured template engine.
+    """
+    return [
+        pathlib.Path(directory)
+        for engine in engines.all()
+        for directory in engine.template_dirs
+    ]
+
+
+@functools.lru_cache(maxsize=1)
+def get_url_fetcher() -> URLFetcher | None:
+    """
+    Return the process-wide URL fetcher, or `None` if `PDF_ASSETS` is not set.
+    """
+    config = getattr(settings, "PDF_ASSETS", None)
+    if config is None:
+        return None
+
+    asset_cache = AssetCache(
+        max_bytes=config.get("MAX_BYTES", DEFAULT_MAX_BYTES),
+        mmap_threshold=config.get("MMAP_THRESHOLD", DEFAULT_MMAP_THRESHOLD),
+        check_mtime=config.get("CHECK_MTIME", settings.DEBUG),
+    )
+    memory.register_cache(asset_cache.clear)
+    return AssetFetcher(
+        asset_cache,
+        roots=[*get_template_dirs(), *config.get("ROOTS", [])],
+        static=config.get("STATIC", True),
+        media=config.get("MEDIA", True),
+        allow_network=config.get("ALLOW_NETWORK", False),
+    )
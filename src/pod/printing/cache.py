@@ -0,0 +1,356 @@
+"""
+Content-addressed caching of rendered PDFs.
+
+Rendered documents are keyed by a hash of the template's identity, its source and the
+serialized context, so a cached PDF is only ever served for exactly the same inputs.
+Caches have a bounded in-memory LRU tier and an optional size-capped on-disk tier, and
+are configured by alias in the `PDF_CACHES` setting:
+
+    PDF_CACHES = {
+        "default": {
+            "MAX_MEMORY_ITEMS": 128,
+            "MAX_MEMORY_BYTES": 64 * 1024 * 1024,
+            "DIRECTORY": BASE_DIR / "pdf-cache",  # None for memory only
+            "MAX_DISK_BYTES": 1024 * 1024 * 1024,
+        },
+    }
+"""
+
+import collections
+import contextlib
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import tempfile
+import threading
+import typing
+
+from django.conf import settings
+from django.core import exceptions
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from . import singleflight
+
+logger = logging.getLogger("report")
+
+DEFAULT_MAX_MEMORY_ITEMS = 128
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 1024 * 1024 * 1024
+
+_bypass = contextvars.ContextVar("pdf_cache_bypass", default=False)
+
+
+class CacheKeyEncoder(DjangoJSONEncoder):
+    """
+    JSON encoder used to serialize render contexts into cache keys.
+
+    Model instances are encoded by the values of all their concrete fields, including
+    non-editable ones and the keys of related objects, so that an edited object produces
+    a different key. Changes to the related objects themselves are not seen; views whose
+    templates follow relations add them to the key with `get_pdf_cache_version()`.
+    Anything else that cannot be serialized raises a `TypeError`, which makes the render
+    uncacheable rather than risking a stale key.
+    """
+
+    def default(self, o: typing.Any) -> typing.Any:
+        if isinstance(o, models.Model):
+            fields = {
+                field.attname: field.value_from_object(o)
+                for field in o._meta.concrete_fields
+            }
+            return {"model": o._meta.label, "pk": o.pk, "fields": fields}
+        return super().default(o)
+
+
+def get_template_source(template: typing.Any) -> str | bytes | None:
+    """
+    Return the source of a Django or Typst template, if it is available.
+    """
+    # Django's backend templates wrap the underlying `django.template.Template`
+    template = getattr(template, "template", template)
+    return typing.cast(str | bytes | None, getattr(template, "source", None))
+
+
+def make_key(
+    template_name: str,
+    source: str | bytes,
+    context: typing.Mapping[str, typing.Any],
+    options: typing.Mapping[str, typing.Any] | None = None,
+) -> str:
+    """
+    Build a stable cache key from the template identity, source and context, and any
+    render options that change the output.
+
+    Raises `TypeError` if the context cannot be serialized.
+    """
+    if isinstance(source, str):
+        source = source.encode("utf-8")
+    context = {k: v for k, v in context.items() if k != "view"}
+    encoded_context = json.dumps(context, cls=CacheKeyEncoder, sort_keys=True)
+
+    digest = hashlib.sha256()
+    digest.update(template_name.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(hashlib.sha256(source).digest())
+    digest.update(encoded_context.encode("utf-8"))
+    if options:
+        digest.update(b"\0")
+        digest.update(json.dumps(options, cls=CacheKeyEncoder, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def make_template_key(
+    template: typing.Any,
+    context: typing.Mapping[str, typing.Any],
+    options: typing.Mapping[str, typing.Any] | None = None,
+) -> str | None:
+    """
+    Build the cache key for rendering a template with the given context.
+
+    Returns `None` when the render cannot be cached, because the template source is
+    unknown or the context cannot be serialized.
+    """
+    source = get_template_source(template)
+    if source is None:
+        return None
+    try:
+        return make_key(template.origin.name, source, context, options)
+    except TypeError as e:
+        logger.debug("Not caching render of %s: %s", template.origin.name, e)
+        return None
+
+
+class PDFCache:
+    """
+    A two-tier cache of rendered PDFs.
+
+    The memory tier is an LRU bounded by both the number of documents and their total
+    size. The optional disk tier stores one file per document under `directory` and
+    evicts the least recently used files once their total size exceeds
+    `max_disk_bytes`. Documents found on disk are promoted back into memory.
+    """
+
+    def __init__(
+        self,
+        max_memory_items: int = DEFAULT_MAX_MEMORY_ITEMS,
+        max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+        directory: str | os.PathLike[str] | None = None,
+        max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+    ) -> None:
+        self.max_memory_items = max_memory_items
+        self.max_memory_bytes = max_memory_bytes
+        self.directory = pathlib.Path(directory) if directory is not None else None
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: collections.OrderedDict[str, bytes] = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: int | None = None
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            pdf = self._memory.get(key)
+            if pdf is not None:
+                self._memory.move_to_end(key)
+                return pdf
+
+        pdf = self._get_from_disk(key)
+        if pdf is not None:
+            self._set_in_memory(key, pdf)
+        return pdf
+
+    def set(self, key: str, pdf: bytes) -> None:
+        self._set_in_memory(key, pdf)
+        self._set_on_disk(key, pdf)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            pdf = self._memory.pop(key, None)
+            if pdf is not None:
+                self._memory_bytes -= len(pdf)
+        path = self._get_path(key)
+        if path is not None:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except OSError:
+                return
+            with self._lock:
+                if self._disk_bytes is not None:
+                    self._disk_bytes -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+        if self.directory is not None:
+            for path in self.directory.glob("*/*.pdf"):
+                path.unlink(missing_ok=True)
+            with self._lock:
+                self._disk_bytes = 0
+
+    def _set_in_memory(self, key: str, pdf: bytes) -> None:
+        if len(pdf) > self.max_memory_bytes:
+            return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = pdf
+            self._memory_bytes += len(pdf)
+            while (
+                len(self._memory) > self.max_memory_items
+                or self._memory_bytes > self.max_memory_bytes
+            ):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _get_path(self, key: str) -> pathlib.Path | None:
+        if self.directory is None:
+            return None
+        return self.directory / key[:2] / f"{key}.pdf"
+
+    def _get_from_disk(self, key: str) -> bytes | None:
+        path = self._get_path(key)
+        if path is None:
+            return None
+        try:
+            pdf = path.read_bytes()
+            # Mark the file as recently used for eviction purposes
+            os.utime(path)
+        except OSError:
+            return None
+        return pdf
+
+    def _set_on_disk(self, key: str, pdf: bytes) -> None:
+        path = self._get_path(key)
+        if path is None or len(pdf) > self.max_disk_bytes:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first so readers never see a partial document
+        fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(pdf)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += len(pdf)
+            disk_bytes = self._disk_bytes
+        if disk_bytes is None or disk_bytes > self.max_disk_bytes:
+            self._evict_from_disk()
+
+    def _evict_from_disk(self) -> None:
+        """
+        Remove the least recently used files until the disk tier fits its size cap.
+
+        The directory may be shared by several processes, so the usage is recounted
+        from the file system rather than trusted from the running total.
+        """
+        if self.directory is None:
+            return
+        files = []
+        for path in self.directory.glob("*/*.pdf"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+        with self._lock:
+            self._disk_bytes = total
+
+
+class PDFCacheHandler:
+    """
+    Lazily creates and holds the process-wide caches defined in `PDF_CACHES`.
+    """
+
+    def __init__(self) -> None:
+        self._caches: dict[str, PDFCache] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, alias: str) -> PDFCache:
+        with self._lock:
+            if alias not in self._caches:
+                self._caches[alias] = self.create_cache(alias)
+            return self._caches[alias]
+
+    def create_cache(self, alias: str) -> PDFCache:
+        config = getattr(settings, "PDF_CACHES", {}).get(alias)
+        if config is None:
+            raise exceptions.ImproperlyConfigured(
+                f"The PDF cache '{alias}' is not defined in the PDF_CACHES setting"
+            )
+        return PDFCache(
+            max_memory_items=config.get("MAX_MEMORY_ITEMS", DEFAULT_MAX_MEMORY_ITEMS),
+            max_memory_bytes=config.get("MAX_MEMORY_BYTES", DEFAULT_MAX_MEMORY_BYTES),
+            directory=config.get("DIRECTORY"),
+            max_disk_bytes=config.get("MAX_DISK_BYTES", DEFAULT_MAX_DISK_BYTES),
+        )
+
+    def all(self) -> list[PDFCache]:
+        with self._lock:
+            return list(self._caches.values())
+
+
+caches = PDFCacheHandler()
+
+
+@contextlib.contextmanager
+def bypass() -> typing.Iterator[None]:
+    """
+    Render without reading from or writing to any cache within the block.
+    """
+    token = _bypass.set(True)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def wants_key(cache: PDFCache | None) -> bool:
+    """
+    Return whether renders should be keyed, to be cached or shared while in flight.
+    """
+    return cache is not None or singleflight.is_enabled()
+
+
+def cached_render(
+    cache: PDFCache | None,
+    key: str | None,
+    render: typing.Callable[[], bytes],
+) -> bytes:
+    """
+    Return the cached PDF for `key`, rendering and storing it on a miss.
+
+    Concurrent misses for the same key share a single render, see `singleflight`.
+    Renders without caching or sharing when the key is `None` or within a `bypass()`
+    block, and without caching when the cache is `None`.
+    """
+    if key is None or _bypass.get():
+        return render()
+    if cache is None:
+        return singleflight.share(key, render)
+
+    pdf = cache.get(key)
+    if pdf is None:
+
+        def render_and_store() -> bytes:
+            pdf = render()
+            cache.set(key, pdf)
+            return pdf
+
+        pdf = singleflight.share(key, render_and_store, lambda: cache.get(key))
+    return pdf
@@ -1,32 +1,119 @@
 from __future__ import annotations
 
+import functools
+import io
+import itertools
 import json
+import os
 import pathlib
 import typing
 
-import typst
+from django.conf import settings
+from django.core import exceptions
 from django.core.serializers.json import DjangoJSONEncoder
 from django.http.request import HttpRequest
 from django.template import Origin, TemplateDoesNotExist
 from django.template.backends.base import BaseEngine
 
+from . import admission, cache, memory, pools, profiling, timing
+
+# Typst and pypdf are only imported when they are first used, so that processes that
+# never render a PDF do not pay for importing them.
+if typing.TYPE_CHECKING:
+    import typst
+
 UNKNOWN_SOURCE = "<unknown source>"
 
+# The number of distinct (source, root) combinations that keep warm compilers around.
+COMPILER_POOL_CACHE_SIZE = 32
+
+# The Typst options that can be set to control the PDF output
+PDF_OPTIONS = frozenset(
+    {
+        "pdf_standards",  # e.g. "a-2b" or ["a-3b", "ua-1"]
+        "timestamp",  # the creation date, for reproducible output
+        "pretty",  # write the PDF uncompressed and human-readable
+    }
+)
+
 
 class TypstEngine(BaseEngine):
     """
     A template engine for rendering Typst templates.
+
+    Supported `OPTIONS`:
+
+    - `cache_templates`: keep loaded templates in memory instead of reading them from
+      disk on every request (default: `True`).
+    - `check_mtime`: when caching, re-read a template if its file has been modified
+      since it was loaded (default: `settings.DEBUG`). With this off, a cached template
+      is returned without touching the file system at all.
+    - `pdf_cache`: the alias of a `PDF_CACHES` entry to cache rendered PDFs in
+      (default: `None`, no caching).
+    - `pdf_options`: options passed to the Typst compiler to control the PDF output,
+      see `PDF_OPTIONS` (default: `{}`). Typst embeds images as they are, so there
+      are no image downsampling options.
+    - `admission`: the `PDF_ADMISSION` entry limiting how many templates are compiled at
+      once (default: `"typst"`), or `None` for no limit.
     """
 
     def __init__(self, params: dict[str, typing.Any]) -> None:
         params = params.copy()
-        params.pop("OPTIONS", None)
+        options = params.pop("OPTIONS", {}).copy()
         super().__init__(params)
 
+        self.cache_templates: bool = options.pop("cache_templates", True)
+        self.check_mtime: bool = options.pop("check_mtime", settings.DEBUG)
+        self.pdf_cache: str | None = options.pop("pdf_cache", None)
+        self.pdf_options: dict[str, typing.Any] = options.pop("pdf_options", {})
+        self.admission: str | None = options.pop("admission", "typst")
+        unknown = self.pdf_options.keys() - PDF_OPTIONS
+        if unknown:
+            raise exceptions.ImproperlyConfigured(
+                f"Unknown PDF options for the Typst template engine: "
+                f"{', '.join(sorted(unknown))}"
+            )
+        if options:
+            raise exceptions.ImproperlyConfigured(
+                f"Unknown options for the Typst template engine: {', '.join(options)}"
+            )
+
+        self._template_cache: dict[str, tuple[TypstTemplate, int | None]] = {}
+
     def from_string(self, template_code: str) -> TypstTemplate:  # type: ignore[override]
-        return TypstTemplate(template_code.encode("utf-8"))
+        return TypstTemplate(
+            template_code.encode("utf-8"),
+            pdf_cache=self.get_pdf_cache(),
+            pdf_options=self.pdf_options,
+            admission=self.admission,
+        )
 
     def get_template(self, template_name: str) -> TypstTemplate:  # type: ignore[override]
+        with timing.stage("resolve_template"):
+            return self.get_cached_template(template_name)
+
+    def get_cached_template(self, template_name: str) -> TypstTemplate:
+        """
+        Return the template, from the in-memory cache if it is enabled.
+        """
+        if not self.cache_templates:
+            return self.load_template(template_name)
+
+        cached = self._template_cache.get(template_name)
+        if cached is not None:
+            template, mtime = cached
+            if not self.check_mtime or self.get_mtime(template) == mtime:
+                return template
+
+        template = self.load_template(template_name)
+        mtime = self.get_mtime(template) if self.check_mtime else None
+        self._template_cache[template_name] = (template, mtime)
+        return template
+
+    def load_template(self, template_name: str) -> TypstTemplate:
+        """
+        Find the template in the template directories and read it from disk.
+        """
         tried = []
 
         for template_path in self.iter_template_filenames(template_name):
@@ -39,10 +126,101 @@ class TypstEngine(BaseEngine):
 
             if path.exists() and path.is_file():
                 template_code = path.read_bytes()
-                return TypstTemplate(template_code, origin=origin)
+                return TypstTemplate(
+                    template_code,
+                    origin=origin,
+                    pdf_cache=self.get_pdf_cache(),
+                    pdf_options=self.pdf_options,
+                    admission=self.admission,
+                )
 
         raise TemplateDoesNotExist(template_name, tried=tried, backend=self)
 
+    def get_pdf_cache(self) -> cache.PDFCache | None:
+        return cache.caches[self.pdf_cache] if self.pdf_cache else None
+
+    def get_mtime(self, template: TypstTemplate) -> int | None:
+        """
+        Return the modification time of the template's file, if it still exists.
+        """
+        try:
+            return os.stat(template.origin.name).st_mtime_ns
+        except OSError:
+            return None
+
+    def reset(self) -> None:
+        """
+        Forget all cached templates.
+        """
+        self._template_cache.clear()
+
+
+class CompilerPool(pools.ObjectPool["typst.Compiler"]):
+    """
+    A pool of warm Typst compilers for a single template source and root.
+
+    Creating a `typst.Compiler` scans the font paths and sets up a fresh "world". Doing
+    that once and then reusing the compiler means later compiles only have to redo the
+    work affected by changed `sys.inputs`, with fonts and parsed modules kept warm.
+    """
+
+    def __init__(
+        self,
+        source: bytes,
+        root: str | None,
+        font_paths: tuple[str, ...],
+    ) -> None:
+        super().__init__(self.create_compiler)
+        self.source = source
+        self.root = root
+        self.font_paths = font_paths
+
+    def create_compiler(self) -> typst.Compiler:
+        import typst
+
+        return typst.Compiler(root=self.root, font_paths=list(self.font_paths))
+
+    def compile(
+        self,
+        sys_inputs: dict[str, str],
+        pdf_options: typing.Mapping[str, typing.Any] | None = None,
+    ) -> bytes:
+        with self.checkout() as compiler, timing.stage("typst_compile"):
+            return typing.cast(
+                bytes,
+                compiler.compile(
+                    input=self.source, sys_inputs=sys_inputs, **(pdf_options or {})
+                ),
+            )
+
+
+@functools.lru_cache(maxsize=COMPILER_POOL_CACHE_SIZE)
+def get_compiler_pool(
+    source: bytes,
+    root: str | None,
+    font_paths: tuple[str, ...],
+) -> CompilerPool:
+    """
+    Return the shared compiler pool for the given source, root and font paths.
+    """
+    return CompilerPool(source, root, font_paths)
+
+
+def clear_caches() -> None:
+    """
+    Forget the warm compilers, and the templates of every Typst engine holding on to
+    them.
+    """
+    from django.template import engines
+
+    get_compiler_pool.cache_clear()
+    for engine in engines.all():
+        if isinstance(engine, TypstEngine):
+            engine.reset()
+
+
+memory.register_cache(clear_caches)
+
 
 class TypstTemplate:
     """
@@ -53,8 +231,14 @@ class TypstTemplate:
         self,
         template_code: bytes,
         origin: Origin | None = None,
+        pdf_cache: cache.PDFCache | None = None,
+        pdf_options: typing.Mapping[str, typing.Any] | None = None,
+        admission: str | None = None,
     ):
         self.source = template_code
+        self.pdf_cache = pdf_cache
+        self.pdf_options = dict(pdf_options or {})
+        self.admission = admission
         if origin is None:
             self.origin = Origin(UNKNOWN_SOURCE)
         else:
@@ -75,20 +259,140 @@ class TypstTemplate:
 
         context.pop("view", None)  # views are not json serializable
 
-        root = None
-        font_paths = []
-        if self.origin.name != UNKNOWN_SOURCE:
-            # Use the directory of the template as the root for relative paths
-            # again if this was a proper Typst template engine, I would probably
-            # want to make these configurable via the settings.
-            root = pathlib.Path(self.origin.name).parent.as_posix()
-            font_paths = [root]
-
-        encoded_context = json.dumps(context, cls=DjangoJSONEncoder)
-
-        return typst.compile(
-            input=self.source,  # type: ignore[misc]
-            root=root,
-            sys_inputs={"context": encoded_context},
-            font_paths=font_paths,
+        with timing.stage("json_encode"):
+            encoded_context = json.dumps(context, cls=DjangoJSONEncoder)
+
+        key = (
+            cache.make_template_key(self, context, self.pdf_options)
+            if cache.wants_key(self.pdf_cache)
+            else None
+        )
+        return cache.cached_render(
+            self.pdf_cache,
+            key,
+            lambda: self.compile({"context": encoded_context}),
+        )
+
+    def render_batch(
+        self,
+        contexts: typing.Iterable[dict[str, typing.Any]],
+        request: HttpRequest | None = None,
+    ) -> bytes:
+        """
+        Render every context in a single compile, as one multi-page document.
+
+        The contexts are passed to Typst as a JSON list in `sys.inputs.contexts`. A
+        template that supports batches renders each context from a new page and, so the
+        document can be split again with `render_each`, restarts the page counter (with
+        page numbering set) at the start of each one.
+        """
+        contexts = [
+            {k: v for k, v in context.items() if k != "view"} for context in contexts
+        ]
+
+        with timing.stage("json_encode"):
+            encoded_contexts = json.dumps(contexts, cls=DjangoJSONEncoder)
+
+        key = (
+            cache.make_template_key(self, {"contexts": contexts}, self.pdf_options)
+            if cache.wants_key(self.pdf_cache)
+            else None
+        )
+        return cache.cached_render(
+            self.pdf_cache,
+            key,
+            lambda: self.compile({"contexts": encoded_contexts}),
         )
+
+    def render_each(
+        self,
+        contexts: typing.Iterable[dict[str, typing.Any]],
+        request: HttpRequest | None = None,
+    ) -> list[bytes]:
+        """
+        Render every context in a single compile, split into one PDF per context.
+        """
+        contexts = list(contexts)
+        if not contexts:
+            return []
+        pdf = self.render_batch(contexts, request=request)
+        with timing.stage("split_pdf"):
+            return split_pdf(pdf, len(contexts))
+
+    def compile(self, sys_inputs: dict[str, str]) -> bytes:
+        label = str(self.origin.template_name or self.origin.name)
+        with (
+            admission.admit(self.admission),
+            memory.track_render(label),
+            profiling.profile(label, self.describe(sys_inputs)),
+        ):
+            return self.compilers.compile(sys_inputs, self.pdf_options)
+
+    def describe(self, sys_inputs: dict[str, str]) -> dict[str, typing.Any]:
+        """
+        Describe a compile in saved profiles.
+        """
+        return {
+            "engine": "typst",
+            "context_bytes": sum(len(value) for value in sys_inputs.values()),
+            "pdf_options": self.pdf_options,
+        }
+
+    @property
+    def root(self) -> str | None:
+        """
+        The root directory used to resolve relative paths in the template.
+        """
+        if self.origin.name == UNKNOWN_SOURCE:
+            return None
+        # Use the directory of the template as the root for relative paths
+        # again if this was a proper Typst template engine, I would probably
+        # want to make these configurable via the settings.
+        return pathlib.Path(self.origin.name).parent.as_posix()
+
+    @property
+    def font_paths(self) -> tuple[str, ...]:
+        """
+        The directories searched for fonts, alongside the system fonts.
+        """
+        root = self.root
+        return (root,) if root is not None else ()
+
+    @functools.cached_property
+    def compilers(self) -> CompilerPool:
+        """
+        The warm compilers shared by every template with this source and root.
+        """
+        return get_compiler_pool(self.source, self.root, self.font_paths)
+
+
+def split_pdf(pdf: bytes, count: int) -> list[bytes]:
+    """
+    Split a batch document into `count` documents.
+
+    Each document starts on a page whose page label is "1", i.e. where the page counter
+    was restarted. Without restarts, a document with exactly `count` pages is split into
+    one page per document. Raises `ValueError` if the document cannot be split.
+    """
+    import pypdf
+
+    reader = pypdf.PdfReader(io.BytesIO(pdf))
+    page_count = len(reader.pages)
+
+    starts = [i for i, label in enumerate(reader.page_labels) if label == "1"]
+    if len(starts) != count:
+        if page_count != count:
+            raise ValueError(
+                f"Cannot split a {page_count} page document into {count} documents"
+            )
+        starts = list(range(count))
+
+    documents = []
+    for start, end in itertools.pairwise([*starts, page_count]):
+        writer = pypdf.PdfWriter()
+        for page in reader.pages[start:end]:
+            writer.add_page(page)
+        output = io.BytesIO()
+        writer.write(output)
+        documents.append(output.getvalue())
+    return documents
@@ -0,0 +1,312 @@
+"""
+A pool of warm worker processes for rendering WeasyPrint PDFs.
+
+WeasyPrint layout is pure Python and holds the GIL, so a single process can only use
+one core for PDFs. The render farm sends jobs to worker processes that have already
+imported WeasyPrint, loaded the templates and warmed their font configurations. Only
+the template name and the context cross the process boundary, and the PDF bytes come
+back.
+
+The farm is configured with the `PDF_RENDER_FARM` setting:
+
+    PDF_RENDER_FARM = {
+        "PROCESSES": 4,
+        "MAX_JOBS_PER_WORKER": 500,  # None for no limit
+        "MAX_WORKER_RSS": 512 * 1024 * 1024,  # bytes, None for no limit
+        # Template names, or (template name, stylesheets) pairs
+        "WARM_TEMPLATES": [("invoice/invoice.html", ["invoice.css"])],
+        "START_METHOD": "spawn",
+    }
+
+Workers are recycled once they have rendered `MAX_JOBS_PER_WORKER` documents or their
+RSS grows past `MAX_WORKER_RSS`; a replacement is started on the next job. A template
+whose `@font-face` rules live in stylesheets is warmed with those stylesheets, as its
+view's `pdf_stylesheets`, so that its fonts are loaded too.
+"""
+
+import functools
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+import typing
+from multiprocessing import connection as mp_connection
+
+from django.conf import settings
+
+from . import memory
+
+logger = logging.getLogger("report")
+
+
+class RenderFarmError(Exception):
+    """
+    A render failed inside a worker process.
+    """
+
+
+# A template name, or a template name and the stylesheets it is rendered with
+WarmTemplate = str | tuple[str, typing.Sequence[str]]
+
+
+def _warm(warm_templates: typing.Sequence[WarmTemplate]) -> None:
+    """
+    Load the templates and run a throwaway render of each to warm the font caches.
+    """
+    from django.template import loader
+
+    from . import generation
+
+    for warm_template in warm_templates:
+        stylesheets: typing.Sequence[str]
+        if isinstance(warm_template, str):
+            template_name, stylesheets = warm_template, ()
+        else:
+            template_name, stylesheets = warm_template
+        try:
+            template = loader.get_template(template_name)
+            generator = generation.WeasyPrintPDFGenerator(
+                template=template,  # type: ignore[arg-type]
+                stylesheets=stylesheets,
+            )
+            generator.get_pdf()
+        except Exception:
+            logger.exception("Failed to warm template %s", template_name)
+
+
+def _render(
+    template_name: str,
+    context: dict[str, object],
+    using: str | None,
+    stylesheets: typing.Sequence[str],
+    pdf_options: dict[str, typing.Any],
+) -> bytes:
+    from django.template import loader
+
+    from . import generation
+
+    template = loader.get_template(template_name, using=using)
+    generator = generation.WeasyPrintPDFGenerator(
+        template=template,  # type: ignore[arg-type]
+        context=context,
+        stylesheets=stylesheets,
+        pdf_options=pdf_options,
+    )
+    return generator.get_pdf()
+
+
+def _worker_main(
+    conn: mp_connection.Connection,
+    warm_templates: typing.Sequence[WarmTemplate],
+    max_jobs: int | None,
+    max_rss: int | None,
+) -> None:
+    """
+    The main loop of a worker process.
+
+    Receives `(template_name, context, using, stylesheets, pdf_options)` jobs and
+    replies to each with `(ok, pdf_or_error, retiring)`, until it is told to stop or
+    decides to retire.
+    """
+    import django
+
+    django.setup()
+    # Workers are recycled by the farm, with its own limits
+    memory.disable_governor()
+    _warm(warm_templates)
+
+    jobs = 0
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+
+        jobs += 1
+        try:
+            result: tuple[bool, bytes | str] = (True, _render(*job))
+        except Exception:
+            result = (False, traceback.format_exc())
+
+        rss = memory.get_rss()
+        retiring = (max_jobs is not None and jobs >= max_jobs) or (
+            max_rss is not None and rss is not None and rss > max_rss
+        )
+        conn.send((*result, retiring))
+        if retiring:
+            return
+
+
+class RenderWorker:
+    """
+    The parent-side handle of a single worker process.
+    """
+
+    def __init__(
+        self,
+        mp_context: typing.Any,
+        warm_templates: typing.Sequence[WarmTemplate],
+        max_jobs: int | None,
+        max_rss: int | None,
+    ) -> None:
+        self.conn, child_conn = mp_context.Pipe()
+        self.process = mp_context.Process(
+            target=_worker_main,
+            args=(child_conn, list(warm_templates), max_jobs, max_rss),
+            name="pdf-render-worker",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        self.alive = True
+
+    def render(
+        self,
+        template_name: str,
+        context: dict[str, object],
+        using: str | None,
+        stylesheets: typing.Sequence[str] = (),
+        pdf_options: typing.Mapping[str, typing.Any] | None = None,
+    ) -> bytes:
+        options = dict(pdf_options or {})
+        try:
+            self.conn.send((template_name, context, using, list(stylesheets), options))
+            ok, payload, retiring = self.conn.recv()
+        except (EOFError, OSError) as e:
+            self.close()
+            raise RenderFarmError(
+                f"Render worker {self.process.pid} exited unexpectedly"
+            ) from e
+
+        if retiring:
+            logger.info("Recycling render worker %s", self.process.pid)
+            self.close()
+        if not ok:
+            raise RenderFarmError(payload)
+        return typing.cast(bytes, payload)
+
+    def close(self) -> None:
+        if not self.alive:
+            return
+        self.alive = False
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.conn.close()
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+
+
+class RenderFarm:
+    """
+    Renders PDFs on a bounded set of warm worker processes.
+
+    Each worker handles one job at a time. Callers block until a worker is free, so at
+    most `processes` documents are rendered at once.
+    """
+
+    def __init__(
+        self,
+        processes: int | None = None,
+        max_jobs_per_worker: int | None = None,
+        max_worker_rss: int | None = None,
+        warm_templates: typing.Sequence[WarmTemplate] = (),
+        start_method: str = "spawn",
+    ) -> None:
+        self.processes = processes or os.cpu_count() or 1
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_worker_rss = max_worker_rss
+        self.warm_templates = warm_templates
+        self.mp_context = multiprocessing.get_context(start_method)
+
+        self._idle: queue.LifoQueue[RenderWorker] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.processes)
+        self._workers: list[RenderWorker] = []
+        self._lock = threading.Lock()
+
+    def start_worker(self) -> RenderWorker:
+        worker = RenderWorker(
+            self.mp_context,
+            self.warm_templates,
+            self.max_jobs_per_worker,
+            self.max_worker_rss,
+        )
+        with self._lock:
+            self._workers = [w for w in self._workers if w.alive]
+            self._workers.append(worker)
+        return worker
+
+    def start(self) -> None:
+        """
+        Start any workers that are not yet running, so they warm up before first use.
+        """
+        with self._lock:
+            missing = self.processes - sum(w.alive for w in self._workers)
+        for _ in range(missing):
+            self._idle.put(self.start_worker())
+
+    def render(
+        self,
+        template_name: str,
+        context: dict[str, object] | None = None,
+        using: str | None = None,
+        stylesheets: typing.Sequence[str] = (),
+        pdf_options: typing.Mapping[str, typing.Any] | None = None,
+    ) -> bytes:
+        """
+        Render the named template to a PDF on a worker process.
+
+        The context must be picklable.
+        """
+        context = {k: v for k, v in (context or {}).items() if k != "view"}
+        with self._slots:
+            worker = self._get_idle_worker() or self.start_worker()
+            try:
+                return worker.render(
+                    template_name, context, using, stylesheets, pdf_options
+                )
+            finally:
+                if worker.alive:
+                    self._idle.put(worker)
+
+    def _get_idle_worker(self) -> RenderWorker | None:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return None
+            if worker.alive and worker.process.is_alive():
+                return worker
+            worker.close()
+
+    def close(self) -> None:
+        """
+        Stop all worker processes.
+        """
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+
+
+@functools.lru_cache(maxsize=1)
+def get_render_farm() -> RenderFarm | None:
+    """
+    Return the process-wide render farm, or `None` if `PDF_RENDER_FARM` is not set.
+    """
+    config = getattr(settings, "PDF_RENDER_FARM", None)
+    if config is None:
+        return None
+    return RenderFarm(
+        processes=config.get("PROCESSES"),
+        max_jobs_per_worker=config.get("MAX_JOBS_PER_WORKER"),
+        max_worker_rss=config.get("MAX_WORKER_RSS"),
+        warm_templates=config.get("WARM_TEMPLATES", ()),
+        start_method=config.get("START_METHOD", "spawn"),
+    )
@@ -1,20 +1,216 @@
+from __future__ import annotations
+
+import contextlib
+import functools
+import io
+import itertools
 import pathlib
+import shutil
+import tempfile
+import threading
 import typing
+import weakref
 
-import weasyprint
+from django.db import models
 from django.template import base as template_base
 from django.template import loader
-from weasyprint.text import fonts
+
+from . import assets, memory, pools, profiling, timing
+
+# WeasyPrint takes a while to import, so it is only imported when the first document is
+# rendered rather than by everything that imports the printing package.
+if typing.TYPE_CHECKING:
+    import weasyprint
+    from weasyprint.text import fonts
+
+# The number of template directories that keep shared font configurations around.
+FONT_CONFIG_CACHE_SIZE = 32
+
+# The WeasyPrint options that can be set to control the PDF output
+PDF_OPTIONS = frozenset(
+    {
+        "optimize_images",  # losslessly re-encode images
+        "jpeg_quality",  # re-encode JPEGs at this quality, 0-95
+        "dpi",  # downsample images to at most this resolution
+        "hinting",  # keep hinting information in embedded fonts
+        "full_fonts",  # embed whole fonts rather than subsets
+        "uncompressed_pdf",  # leave the PDF streams uncompressed
+        "pdf_variant",  # e.g. "pdf/a-3b" or "pdf/ua-1"
+        "pdf_version",
+        "srgb",
+        "presentational_hints",
+        "custom_metadata",
+    }
+)
+
+
+@functools.lru_cache(maxsize=FONT_CONFIG_CACHE_SIZE)
+def shared_font_config_pool(base_url: str) -> pools.ObjectPool[fonts.FontConfiguration]:
+    """
+    Return the shared font configurations for templates in the given directory.
+
+    Creating a `FontConfiguration` initialises fontconfig, and the first render with it
+    loads the fonts declared by the stylesheets' `@font-face` rules. Sharing them means
+    that work is done once per worker rather than for every document.
+    """
+    from weasyprint.text import fonts
+
+    return pools.ObjectPool(fonts.FontConfiguration)
+
+
+# Parsed stylesheets by the font configuration they were parsed with, then by path and
+# modification time.
+_stylesheets: weakref.WeakKeyDictionary[
+    fonts.FontConfiguration, dict[tuple[str, int], weasyprint.CSS]
+] = weakref.WeakKeyDictionary()
+_stylesheets_lock = threading.Lock()
+
+
+def get_fetcher_kwargs() -> dict[str, typing.Any]:
+    """
+    Return the `url_fetcher` argument for WeasyPrint, if `PDF_ASSETS` is configured.
+    """
+    url_fetcher = assets.get_url_fetcher()
+    return {"url_fetcher": url_fetcher} if url_fetcher is not None else {}
+
+
+def get_shared_stylesheet(
+    path: pathlib.Path, font_config: fonts.FontConfiguration
+) -> weasyprint.CSS:
+    """
+    Return the parsed stylesheet at `path`, parsing it only if it is new or changed.
+
+    `@font-face` rules are loaded into the font configuration a stylesheet is parsed
+    with, so stylesheets are parsed and kept once per font configuration.
+    """
+    key = (path.as_posix(), path.stat().st_mtime_ns)
+    with _stylesheets_lock:
+        parsed = _stylesheets.setdefault(font_config, {})
+        stylesheet = parsed.get(key)
+    if stylesheet is not None:
+        return stylesheet
+
+    import weasyprint
+
+    stylesheet = weasyprint.CSS(
+        filename=key[0], font_config=font_config, **get_fetcher_kwargs()
+    )
+    with _stylesheets_lock:
+        # Forget earlier versions of the file
+        for stale in [k for k in parsed if k[0] == key[0]]:
+            del parsed[stale]
+        parsed[key] = stylesheet
+    return stylesheet
+
+
+def get_stylesheet_versions(
+    template: typing.Any, stylesheets: typing.Sequence[str]
+) -> list[tuple[str, int | None]]:
+    """
+    Return the path and modification time of each shared stylesheet of a template, or
+    `None` for the time of a missing file.
+
+    These go into the keys of cached PDFs, so that editing a stylesheet, which is then
+    parsed again, does not leave documents rendered with the old one in the caches.
+    """
+    base_url = pathlib.Path(template.origin.name).parent
+    versions: list[tuple[str, int | None]] = []
+    for stylesheet in stylesheets:
+        path = base_url / stylesheet
+        try:
+            versions.append((path.as_posix(), path.stat().st_mtime_ns))
+        except OSError:
+            versions.append((path.as_posix(), None))
+    return versions
+
+
+def clear_caches() -> None:
+    """
+    Forget the shared font configurations and parsed stylesheets.
+
+    Documents being rendered keep the font configuration they checked out.
+    """
+    shared_font_config_pool.cache_clear()
+    with _stylesheets_lock:
+        _stylesheets.clear()
+
+
+memory.register_cache(clear_caches)
+
+
+# The number of rows laid out at a time in large-document mode
+DEFAULT_ROWS_PER_CHUNK = 500
+
+
+class DocumentChunk(typing.NamedTuple):
+    """
+    The part of a large document being rendered, given to its template as `pdf_chunk`.
+    """
+
+    number: int
+    first_page: int
+    is_first: bool
+    is_last: bool
+
+
+def iter_chunks(
+    objects: typing.Iterable[typing.Any], chunk_size: int
+) -> typing.Iterator[list[typing.Any]]:
+    """
+    Iterate over the objects in lists of at most `chunk_size` items.
+
+    Querysets are streamed from the database with `.iterator()` so that only one chunk
+    of model instances is held in memory at a time.
+    """
+    if isinstance(objects, models.QuerySet):
+        objects = objects.iterator(chunk_size=chunk_size)
+    for chunk in itertools.batched(objects, chunk_size):
+        yield list(chunk)
 
 
 class WeasyPrintPDFGenerator:
+    """
+    Renders a template to a PDF with WeasyPrint.
+
+    With `chunk_rows`, the document is rendered in large-document mode. The context
+    variable it names holds the rows of the document's table, and may be lazy, such as
+    a queryset or a generator. The template is rendered and laid out `rows_per_chunk`
+    rows at a time, with the variable set to the chunk's rows and `pdf_chunk` to a
+    `DocumentChunk`, and the pages of every chunk are joined into one PDF. Only one
+    chunk is laid out at a time, so the memory used by layout depends on the size of a
+    chunk rather than the number of rows. The finished chunks are spooled to temporary
+    files, but joining them still holds the objects of the whole PDF in memory, and
+    `get_pdf()` also returns the whole PDF; use `write_pdf()` to write it to a file.
+
+    Each chunk starts on a new page, and templates should only show what comes before
+    and after the table when `pdf_chunk.is_first` and `pdf_chunk.is_last` are set.
+    Table headers are repeated on every page, and `counter(page)` carries on from one
+    chunk to the next, but `counter(pages)` only counts the pages of the chunk. Joining
+    the chunks keeps the document's metadata but not PDF variants such as PDF/A.
+    """
+
     def __init__(
         self,
         template: template_base.Template,
         context: dict[str, object] | None = None,
+        stylesheets: typing.Sequence[str] = (),
+        pdf_options: typing.Mapping[str, typing.Any] | None = None,
+        chunk_rows: str | None = None,
+        rows_per_chunk: int = DEFAULT_ROWS_PER_CHUNK,
+        first_page: int = 1,
     ) -> None:
         self.template = template
         self.context = context or {}
+        self.stylesheets = stylesheets
+        self.pdf_options = dict(pdf_options or {})
+        self.chunk_rows = chunk_rows
+        self.rows_per_chunk = rows_per_chunk
+        # The number of the document's first page, when it continues another
+        self.first_page = first_page
+
+        unknown = self.pdf_options.keys() - PDF_OPTIONS
+        if unknown:
+            raise ValueError(f"Unknown PDF options: {', '.join(sorted(unknown))}")
 
     def get_base_url(self) -> pathlib.Path:
         """
@@ -25,15 +221,36 @@ class WeasyPrintPDFGenerator:
         """
         return pathlib.Path(self.template.origin.name).parent
 
-    def get_font_config(self) -> fonts.FontConfiguration:
-        return fonts.FontConfiguration()
+    def get_label(self) -> str:
+        """
+        Name the document in log messages.
+        """
+        return str(self.template.origin.template_name or self.template.origin.name)
 
-    def get_pdf(self) -> bytes:
+    def describe(self) -> dict[str, typing.Any]:
         """
-        Returns rendered PDF pages.
+        Describe the document in saved profiles.
+        """
+        description = {
+            "engine": "weasyprint",
+            **profiling.describe_context(self.context),
+            "pdf_options": self.pdf_options,
+        }
+        if self.chunk_rows is not None:
+            description["rows_per_chunk"] = self.rows_per_chunk
+        return description
+
+    def get_font_config_pool(self) -> pools.ObjectPool[fonts.FontConfiguration]:
+        """
+        Return the pool of font configurations to render the template with.
+        """
+        return shared_font_config_pool(self.get_base_url().as_posix())
+
+    def get_html(self) -> weasyprint.HTML:
+        """
+        Render the template and return the HTML document to lay out.
         """
         base_url = self.get_base_url()
-        font_config = self.get_font_config()
         template_name = (
             self.template.name
             if isinstance(self.template, template_base.Template)
@@ -42,18 +259,164 @@ class WeasyPrintPDFGenerator:
         if not template_name:
             raise ValueError("The provided template is missing a name.")
 
-        html = weasyprint.HTML(
-            string=self.template.render(self.context),  # type: ignore[arg-type]
-            base_url=base_url.as_posix(),
+        with timing.stage("template_render"):
+            html = self.template.render(self.context)  # type: ignore[arg-type]
+        with timing.stage("html_parse"):
+            import weasyprint
+
+            return weasyprint.HTML(
+                string=html, base_url=base_url.as_posix(), **get_fetcher_kwargs()
+            )
+
+    def get_stylesheets(
+        self, font_config: fonts.FontConfiguration
+    ) -> list[weasyprint.CSS]:
+        """
+        Return the shared stylesheets, parsed with the given font configuration.
+
+        Stylesheet paths are relative to the template's directory.
+        """
+        base_url = self.get_base_url()
+        with timing.stage("stylesheets"):
+            stylesheets = [
+                get_shared_stylesheet(base_url / stylesheet, font_config)
+                for stylesheet in self.stylesheets
+            ]
+            if self.first_page != 1:
+                import weasyprint
+
+                css = f"@page :first {{ counter-reset: page {self.first_page} }}"
+                stylesheets.append(weasyprint.CSS(string=css))
+            return stylesheets
+
+    def get_document(self, font_config: fonts.FontConfiguration) -> weasyprint.Document:
+        """
+        Lay out the rendered template using the given font configuration.
+        """
+        html = self.get_html()
+        stylesheets = self.get_stylesheets(font_config)
+        with timing.stage("layout"):
+            return html.render(
+                font_config=font_config, stylesheets=stylesheets, **self.pdf_options
+            )
+
+    def get_pdf(self) -> bytes:
+        """
+        Returns rendered PDF pages.
+        """
+        if self.chunk_rows is not None:
+            buffer = io.BytesIO()
+            self.write_chunked_pdf(buffer)
+            return buffer.getvalue()
+
+        # The font configuration must stay checked out until the PDF is written, as the
+        # document refers to the fonts it loaded.
+        with (
+            memory.track_render(self.get_label()),
+            profiling.profile(self.get_label(), self.describe()),
+            self.get_font_config_pool().checkout() as font_config,
+        ):
+            document = self.get_document(font_config)
+            with timing.stage("write_pdf"):
+                return document.write_pdf(**self.pdf_options) or b""
+
+    def write_pdf(self, target: typing.BinaryIO) -> None:
+        """
+        Writes the rendered PDF pages to a file-like object as they are generated.
+        """
+        if self.chunk_rows is not None:
+            self.write_chunked_pdf(target)
+            return
+
+        with (
+            memory.track_render(self.get_label()),
+            profiling.profile(self.get_label(), self.describe()),
+            self.get_font_config_pool().checkout() as font_config,
+        ):
+            document = self.get_document(font_config)
+            with timing.stage("write_pdf"):
+                document.write_pdf(target, **self.pdf_options)
+
+    def get_chunks(self) -> typing.Iterator[tuple[list[typing.Any], bool]]:
+        """
+        Iterate over the rows in chunks, with whether each chunk is the last.
+
+        A document without rows still has one, empty, chunk.
+        """
+        rows = typing.cast(
+            typing.Iterable[typing.Any] | None,
+            self.context.get(typing.cast(str, self.chunk_rows)),
         )
-        document = html.render(font_config=font_config)
-        return document.write_pdf() or b""
+        # Querysets are not tested for truth, as that would fetch every row
+        chunks = iter_chunks(rows if rows is not None else (), self.rows_per_chunk)
+        chunk = next(chunks, [])
+        while True:
+            following = next(chunks, None)
+            yield chunk, following is None
+            if following is None:
+                return
+            chunk = following
+
+    def get_chunk_generator(
+        self, rows: list[typing.Any], chunk: DocumentChunk
+    ) -> WeasyPrintPDFGenerator:
+        """
+        Return the generator laying out one chunk of a large document.
+        """
+        return WeasyPrintPDFGenerator(
+            template=self.template,
+            context={
+                **self.context,
+                typing.cast(str, self.chunk_rows): rows,
+                "pdf_chunk": chunk,
+            },
+            stylesheets=self.stylesheets,
+            pdf_options=self.pdf_options,
+            first_page=chunk.first_page,
+        )
+
+    def write_chunked_pdf(self, target: typing.BinaryIO) -> None:
+        """
+        Lay out a large document one chunk of rows at a time, and write the pages of
+        every chunk as a single PDF.
+
+        Each chunk is written out as a PDF to a temporary file before the next is laid
+        out, so only the layout of a single chunk is held in memory.
+        """
+
+        def write_chunks(
+            font_config: fonts.FontConfiguration,
+        ) -> typing.Iterator[bytes]:
+            page_count = 0
+            for number, (rows, is_last) in enumerate(self.get_chunks(), start=1):
+                chunk = DocumentChunk(number, page_count + 1, number == 1, is_last)
+                generator = self.get_chunk_generator(rows, chunk)
+                document = generator.get_document(font_config)
+                page_count += len(document.pages)
+                with timing.stage("write_pdf"):
+                    pdf = document.write_pdf(**self.pdf_options) or b""
+                del document
+                yield pdf
+
+        with (
+            memory.track_render(self.get_label()),
+            profiling.profile(self.get_label(), self.describe()),
+            self.get_font_config_pool().checkout() as font_config,
+        ):
+            join_pdfs(write_chunks(font_config), target)
 
     def resolve_template(
         self,
         template: list[str] | tuple[str, ...] | template_base.Template | str,
     ) -> template_base.Template:
         """Resolve and return the template."""
+        with timing.stage("resolve_template"):
+            return self._resolve_template(template)
+
+    def _resolve_template(
+        self,
+        template: list[str] | tuple[str, ...] | template_base.Template | str,
+    ) -> template_base.Template:
         if isinstance(template, template_base.Template):
             return template
         elif isinstance(template, (list, tuple)):
@@ -64,3 +427,68 @@ class WeasyPrintPDFGenerator:
         elif isinstance(template, str):
             return typing.cast(template_base.Template, loader.get_template(template))
         raise ValueError("Invalid template type provided")
+
+
+def join_pdfs(pdfs: typing.Iterable[bytes], target: typing.BinaryIO) -> None:
+    """
+    Write several PDFs to the target as a single document.
+
+    Each PDF is spooled to a temporary file as it is produced, so the parts are not
+    held in memory while the next one is laid out. Joining them holds the objects of
+    the finished PDF, but no layout, in memory.
+    """
+    import pypdf
+
+    with contextlib.ExitStack() as stack:
+        parts: list[typing.BinaryIO] = []
+        for pdf in pdfs:
+            spool = stack.enter_context(tempfile.TemporaryFile())
+            spool.write(pdf)
+            spool.seek(0)
+            parts.append(spool)
+
+        with timing.stage("join_pdf"):
+            # A single PDF needs no joining
+            if len(parts) == 1:
+                shutil.copyfileobj(parts[0], target)
+                return
+
+            writer = pypdf.PdfWriter()
+            for part in parts:
+                reader = pypdf.PdfReader(part)
+                if part is parts[0] and reader.metadata:
+                    writer.add_metadata(reader.metadata)
+                writer.append(reader)
+            writer.write(target)
+
+
+def write_merged_pdf(
+    generators: typing.Iterable[WeasyPrintPDFGenerator],
+    target: typing.BinaryIO,
+) -> None:
+    """
+    Lay out several documents and write their pages as a single PDF.
+
+    Every document is laid out with the same font configuration, taken from the pool of
+    the first generator, so fonts and `@font-face` rules are only loaded once. Each
+    document is written out and its layout dropped before the next is laid out.
+    """
+    generators = iter(generators)
+    first = next(generators, None)
+    if first is None:
+        raise ValueError("At least one document is required to build a PDF.")
+
+    def write_documents(font_config: fonts.FontConfiguration) -> typing.Iterator[bytes]:
+        for generator in itertools.chain([first], generators):
+            document = generator.get_document(font_config)
+            with timing.stage("write_pdf"):
+                pdf = document.write_pdf(**first.pdf_options) or b""
+            del document
+            yield pdf
+
+    with (
+        memory.track_render(first.get_label()),
+        profiling.profile(first.get_label(), first.describe()),
+        first.get_font_config_pool().checkout() as font_config,
+    ):
+        join_pdfs(write_documents(font_config), target)
@@ -0,0 +1,206 @@
+"""
+Invalidating, and optionally re-rendering, an object's cached PDF when it changes.
+
+A `PDFDetailView` renders a document from a single model instance, so its cached PDF
+is stale as soon as the instance is saved or deleted. Registering the view ties it to
+its model's `post_save` and `post_delete` signals:
+
+    invalidation.register(InvoicePDFView, prerender=True)
+
+Cache keys are built from the document's content, so before an instance is saved its
+previous row is loaded and the view builds the context it rendered from it. Once the
+save succeeds, the PDF cached under that key is removed from the view's PDF cache.
+Deleting an instance removes the PDF of its current values. With `prerender`, the new
+PDF is rendered in the background once the transaction commits, so the next download is
+a cache hit.
+
+The context is built from a bare `GET` request for the instance, without a user or
+session, so this only works for views whose context depends on the object alone.
+"""
+
+import logging
+import typing
+
+from django.core import exceptions
+from django.db import connections, models, transaction
+from django.db.models import signals
+from django.test import RequestFactory
+
+from . import cache, responses, views
+
+logger = logging.getLogger("report")
+
+# The instance attribute holding the keys of PDFs made stale by the save in progress
+STALE_KEYS_ATTRIBUTE = "_pdf_stale_keys"
+
+ViewType = typing.TypeVar("ViewType", bound=type[views.PDFObjectMixin])
+
+
+class ObjectInvalidator:
+    """
+    Invalidates the cached PDFs a view rendered for instances of its model.
+    """
+
+    def __init__(
+        self,
+        view_class: type[views.PDFObjectMixin],
+        prerender: bool = False,
+        initkwargs: typing.Mapping[str, typing.Any] | None = None,
+    ) -> None:
+        self.view_class = view_class
+        self.prerender_on_save = prerender
+        self.initkwargs = dict(initkwargs or {})
+        # Identifies the invalidator's signal handlers and the keys it set aside
+        self.uid = (
+            "pod.printing.invalidation:"
+            f"{view_class.__module__}.{view_class.__qualname__}"
+        )
+
+    def get_view(self, instance: models.Model) -> typing.Any:
+        """
+        Return the view set up as if it had looked up the instance itself.
+        """
+        view: typing.Any = self.view_class(**self.initkwargs)
+        view.setup(RequestFactory().get("/"), pk=instance.pk)
+        view.object = instance
+        return view
+
+    def get_response(
+        self, instance: models.Model
+    ) -> responses.PDFTemplateResponse | None:
+        """
+        Return the response the view would render for the instance.
+        """
+        view = self.get_view(instance)
+        context = view.get_context_data(object=instance)
+        response = view.get_pdf_response(context)
+        if not isinstance(response, responses.PDFTemplateResponse):
+            return None
+        return response
+
+    def get_key(self, instance: models.Model) -> tuple[str, str] | None:
+        """
+        Return the alias of the view's PDF cache and the key the instance's PDF is
+        cached under, or `None` if it is not cached.
+        """
+        response = self.get_response(instance)
+        if response is None or not response.pdf_cache:
+            return None
+        key = response.get_render_key()
+        if key is None:
+            return None
+        return response.pdf_cache, key
+
+    def invalidate(self, instance: models.Model, cached: tuple[str, str]) -> None:
+        alias, key = cached
+        cache.caches[alias].delete(key)
+        logger.info(
+            "Invalidated the PDF of %s %s",
+            instance._meta.label,
+            instance.pk,
+            extra={"pdf_key": key},
+        )
+
+    def prerender(self, instance: models.Model) -> None:
+        transaction.on_commit(
+            lambda: views.get_default_render_executor().submit(self.render, instance)
+        )
+
+    def render(self, instance: models.Model) -> None:
+        """
+        Render the instance's PDF into the cache.
+        """
+        try:
+            response = self.get_response(instance)
+            if response is not None:
+                response.render()
+                logger.info(
+                    "Pre-rendered the PDF of %s %s", instance._meta.label, instance.pk
+                )
+        except Exception:
+            logger.exception(
+                "Failed to pre-render the PDF of %s %s",
+                instance._meta.label,
+                instance.pk,
+            )
+        finally:
+            connections.close_all()
+
+    def saving(
+        self, sender: type[models.Model], instance: models.Model, **kwargs: typing.Any
+    ) -> None:
+        """
+        Remember the key of the PDF rendered from the row as it was before the save.
+
+        Keys are built from the content of the document, so the stale PDF can only be
+        found from the instance's previous values.
+        """
+        if kwargs.get("raw") or instance._state.adding or instance.pk is None:
+            return
+        previous = sender._default_manager.filter(pk=instance.pk).first()
+        if previous is None:
+            return
+        cached = self.get_key(previous)
+        if cached is not None:
+            stale = instance.__dict__.setdefault(STALE_KEYS_ATTRIBUTE, {})
+            stale[self.uid] = cached
+
+    def saved(
+        self, sender: type[models.Model], instance: models.Model, **kwargs: typing.Any
+    ) -> None:
+        if kwargs.get("raw"):
+            return
+        cached = instance.__dict__.get(STALE_KEYS_ATTRIBUTE, {}).pop(self.uid, None)
+        if cached is not None:
+            self.invalidate(instance, cached)
+        if self.prerender_on_save:
+            self.prerender(instance)
+
+    def deleted(
+        self, sender: type[models.Model], instance: models.Model, **kwargs: typing.Any
+    ) -> None:
+        cached = self.get_key(instance)
+        if cached is not None:
+            self.invalidate(instance, cached)
+
+
+def get_model(view_class: type[views.PDFObjectMixin]) -> type[models.Model]:
+    model = getattr(view_class, "model", None)
+    queryset = getattr(view_class, "queryset", None)
+    if model is None and queryset is not None:
+        model = queryset.model
+    if model is None:
+        raise exceptions.ImproperlyConfigured(
+            f"{view_class.__name__} needs a model or queryset to invalidate its PDFs"
+        )
+    return typing.cast(type[models.Model], model)
+
+
+def register(
+    view_class: ViewType,
+    model: type[models.Model] | None = None,
+    prerender: bool = False,
+    **initkwargs: typing.Any,
+) -> ViewType:
+    """
+    Invalidate the view's cached PDF of an instance whenever it is saved or deleted.
+
+    `model` defaults to the view's `model`, or that of its `queryset`. Any `initkwargs`
+    are passed to the view, as with `as_view()`. Returns the view class, so this can
+    also be used as `register(View)` at the bottom of a views module.
+    """
+    if model is None:
+        model = get_model(view_class)
+
+    invalidator = ObjectInvalidator(view_class, prerender, initkwargs)
+    uid = invalidator.uid
+    signals.pre_save.connect(
+        invalidator.saving, sender=model, weak=False, dispatch_uid=uid
+    )
+    signals.post_save.connect(
+        invalidator.saved, sender=model, weak=False, dispatch_uid=uid
+    )
+    signals.post_delete.connect(
+        invalidator.deleted, sender=model, weak=False, dispatch_uid=uid
+    )
+    return view_class
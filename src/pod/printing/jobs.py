@@ -0,0 +1,213 @@
+"""
+Background rendering of PDFs through a database-backed job queue.
+
+Views opt in with `pdf_background = True`. Instead of rendering, the request enqueues a
+`RenderJob` and returns `202 Accepted` with the job's URL. The `printing_worker`
+management command drains the queue, and the finished PDF is served from the job URL.
+
+A claimed job is leased to its worker for `DEFAULT_LEASE`. A job still running when
+its lease runs out is presumed to belong to a worker that died, and is claimed again,
+unless it has already been claimed `DEFAULT_MAX_ATTEMPTS` times, when it is failed.
+Leases should be longer than the slowest render.
+"""
+
+import datetime
+import json
+import logging
+import traceback
+import typing
+
+from django import http
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.forms.models import model_to_dict
+from django.template import loader
+from django.utils import timezone
+from django.views.generic import detail
+
+from . import admission, farm, generation
+from .models import RenderJob
+
+logger = logging.getLogger("report")
+
+DEFAULT_LEASE = datetime.timedelta(minutes=10)
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+class JobContextEncoder(DjangoJSONEncoder):
+    """
+    Encodes a render context so it can be stored with a job.
+
+    Model instances are stored as a dictionary of their field values (plus `pk`), which
+    templates can look up in the same way as the instance's attributes. Querysets are
+    stored as a list of their instances.
+    """
+
+    def default(self, o: typing.Any) -> typing.Any:
+        if isinstance(o, models.Model):
+            return {"pk": o.pk, **model_to_dict(o)}
+        if isinstance(o, models.QuerySet):
+            return list(o.iterator())
+        return super().default(o)
+
+
+def enqueue(
+    template_name: str,
+    context: dict[str, typing.Any] | None = None,
+    using: str | None = None,
+    filename: str | None = None,
+    attachment: bool = True,
+    stylesheets: typing.Sequence[str] = (),
+    pdf_options: typing.Mapping[str, typing.Any] | None = None,
+    chunk_rows: str | None = None,
+    rows_per_chunk: int = generation.DEFAULT_ROWS_PER_CHUNK,
+    admission: str | None = None,
+) -> RenderJob:
+    """
+    Queue the template to be rendered to a PDF in the background.
+
+    Raises `TypeError` if the context cannot be serialized.
+    """
+    context = {k: v for k, v in (context or {}).items() if k != "view"}
+    return RenderJob.objects.create(
+        template_name=template_name,
+        using=using or "",
+        context=json.loads(json.dumps(context, cls=JobContextEncoder)),
+        filename=filename or "",
+        attachment=attachment,
+        stylesheets=list(stylesheets),
+        pdf_options=dict(pdf_options or {}),
+        chunk_rows=chunk_rows or "",
+        rows_per_chunk=rows_per_chunk,
+        admission=admission,
+    )
+
+
+def claim_next(
+    lease: datetime.timedelta = DEFAULT_LEASE,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+) -> RenderJob | None:
+    """
+    Claim the oldest pending job, or running job whose lease has run out, or return
+    `None` if the queue is empty.
+
+    A job is claimed by atomically moving it to running with a new start time, so
+    several workers can drain the same queue without locking support from the database.
+    """
+    failed = (
+        RenderJob.objects.expired(lease)
+        .filter(attempts__gte=max_attempts)
+        .update(
+            status=RenderJob.Status.FAILED,
+            error=f"The worker rendering the job stopped {max_attempts} times",
+            finished_at=timezone.now(),
+        )
+    )
+    if failed:
+        logger.warning("Failed %d render jobs whose workers kept stopping", failed)
+
+    while True:
+        job = RenderJob.objects.claimable(lease).only("pk", "status").first()
+        if job is None:
+            return None
+        claimed = (
+            RenderJob.objects.claimable(lease)
+            .filter(pk=job.pk)
+            .update(
+                status=RenderJob.Status.RUNNING,
+                started_at=timezone.now(),
+                attempts=models.F("attempts") + 1,
+            )
+        )
+        if claimed:
+            if job.status == RenderJob.Status.RUNNING:
+                logger.warning(
+                    "Reclaiming render job %s after its lease ran out", job.pk
+                )
+            return RenderJob.objects.get(pk=job.pk)
+
+
+def render(job: RenderJob) -> bytes:
+    with admission.admit(job.admission):
+        return render_pdf(job)
+
+
+def render_pdf(job: RenderJob) -> bytes:
+    render_farm = farm.get_render_farm()
+    # Large documents are rendered in-process, as on the farm they would be laid out
+    # in one go
+    if render_farm is not None and not job.chunk_rows:
+        return render_farm.render(
+            job.template_name,
+            job.context,
+            using=job.using,
+            stylesheets=job.stylesheets,
+            pdf_options=job.pdf_options,
+        )
+
+    template = loader.get_template(job.template_name, using=job.using or None)
+    generator = generation.WeasyPrintPDFGenerator(
+        template=template,  # type: ignore[arg-type]
+        context=job.context,
+        stylesheets=job.stylesheets,
+        pdf_options=job.pdf_options,
+        chunk_rows=job.chunk_rows or None,
+        rows_per_chunk=job.rows_per_chunk,
+    )
+    return generator.get_pdf()
+
+
+def run(job: RenderJob) -> None:
+    """
+    Render a claimed job and store the result.
+    """
+    try:
+        job.pdf = render(job)
+        job.status = RenderJob.Status.DONE
+    except admission.RenderRejected:
+        # The worker is at its render limit, so leave the job for later
+        logger.info("Render job %s was not admitted, requeuing it", job.pk)
+        job.status = RenderJob.Status.PENDING
+        job.started_at = None
+        job.save(update_fields=["status", "started_at"])
+        return
+    except Exception:
+        logger.exception("Render job %s failed", job.pk)
+        job.error = traceback.format_exc()
+        job.status = RenderJob.Status.FAILED
+    job.finished_at = timezone.now()
+    job.save(update_fields=["pdf", "error", "status", "finished_at"])
+
+
+class RenderJobView(detail.BaseDetailView[RenderJob]):
+    """
+    Reports the status of a render job, and serves the PDF once it is done.
+    """
+
+    model = RenderJob
+    # Seconds a client should wait before polling an unfinished job again
+    retry_after = 2
+
+    def render_to_response(
+        self, context: dict[str, typing.Any], **response_kwargs: typing.Any
+    ) -> http.HttpResponse:
+        job = self.object
+
+        if job.status == RenderJob.Status.DONE:
+            response = http.HttpResponse(
+                bytes(job.pdf or b""), content_type="application/pdf"
+            )
+            if job.filename:
+                display = "attachment" if job.attachment else "inline"
+                response.headers["Content-Disposition"] = (
+                    f'{display};filename="{job.filename}"'
+                )
+            return response
+
+        data = {"id": str(job.pk), "status": job.status}
+        if job.status == RenderJob.Status.FAILED:
+            return http.JsonResponse(data, status=500)
+
+        response = http.JsonResponse(data, status=202)
+        response.headers["Retry-After"] = str(self.retry_after)
+        return response
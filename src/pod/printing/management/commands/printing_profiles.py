@@ -0,0 +1,107 @@
+import io
+import pstats
+import typing
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from pod.printing import profiling
+
+
+class Command(BaseCommand):
+    help = "List and summarise the profiles of PDF renders"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "name",
+            nargs="?",
+            help="Summarise this profile instead of listing them all",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=25,
+            help="Number of functions to show in a summary",
+        )
+        parser.add_argument(
+            "--sort",
+            default="cumulative",
+            help="How to sort the functions of a cProfile profile, as for pstats",
+        )
+        parser.add_argument(
+            "--token",
+            action="store_true",
+            help="Print a token for the profiling header",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete every profile",
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:
+        config = profiling.get_config()
+        if config is None:
+            raise CommandError("Set PDF_PROFILING to profile renders")
+
+        if options["token"]:
+            header = config.get("HEADER", profiling.DEFAULT_HEADER)
+            self.stdout.write(f"{header}: {profiling.make_token()}")
+            return
+
+        store = profiling.get_store(config)
+        if options["clear"]:
+            names = store.get_names()
+            for name in names:
+                store.delete(name)
+            self.stdout.write(f"Deleted {len(names)} profiles")
+        elif options["name"]:
+            self.summarise(store, options["name"], options["limit"], options["sort"])
+        else:
+            self.list_profiles(store)
+
+    def list_profiles(self, store: profiling.ProfileStore) -> None:
+        profiles = store.get_profiles()
+        if not profiles:
+            self.stdout.write("No profiles")
+            return
+        for metadata in profiles:
+            self.stdout.write(
+                f"{metadata['name']:<34} {metadata['trigger']:<8}"
+                f" {metadata['duration'] * 1000:10.1f}ms  {metadata['label']}"
+                f"  {self.format_details(metadata['details'])}"
+            )
+
+    def summarise(
+        self, store: profiling.ProfileStore, name: str, limit: int, sort: str
+    ) -> None:
+        metadata = store.get(name)
+        if metadata is None:
+            raise CommandError(f"There is no profile named {name}")
+
+        self.stdout.write(f"Profile:  {name}")
+        self.stdout.write(f"Render:   {metadata['label']}")
+        self.stdout.write(f"Trigger:  {metadata['trigger']}")
+        self.stdout.write(f"Duration: {metadata['duration'] * 1000:.1f}ms")
+        self.stdout.write(f"Threads:  {metadata.get('threads', 'unknown')}")
+        self.stdout.write(f"Created:  {metadata['created']} (pid {metadata['pid']})")
+        self.stdout.write(f"Details:  {self.format_details(metadata['details'])}")
+        self.stdout.write(f"File:     {store.get_path(metadata)}\n")
+
+        path = store.get_path(metadata)
+        if path.suffix == ".prof":
+            output = io.StringIO()
+            stats = pstats.Stats(str(path), stream=output)
+            stats.strip_dirs().sort_stats(sort).print_stats(limit)
+            self.stdout.write(output.getvalue(), ending="")
+            return
+
+        total, functions = profiling.summarise_samples(path)
+        self.stdout.write(f"{total} samples, by time spent in each function's own code")
+        self.stdout.write(f"{'own':>7} {'total':>7}  function")
+        for function, inclusive, own in functions[:limit]:
+            self.stdout.write(
+                f"{own / total:7.1%} {inclusive / total:7.1%}  {function}"
+            )
+
+    def format_details(self, details: typing.Mapping[str, typing.Any]) -> str:
+        return " ".join(f"{key}={value}" for key, value in details.items())
@@ -0,0 +1,90 @@
+import datetime
+import threading
+import typing
+from concurrent import futures
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connections
+
+from pod.printing import jobs
+
+
+class Command(BaseCommand):
+    help = "Render queued PDF jobs in the background"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=1,
+            help="Number of jobs to render at the same time",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to wait before checking an empty queue again",
+        )
+        parser.add_argument(
+            "--lease",
+            type=float,
+            default=jobs.DEFAULT_LEASE.total_seconds(),
+            help="Seconds after which a running job is presumed abandoned",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=jobs.DEFAULT_MAX_ATTEMPTS,
+            help="Times a job is claimed before it is failed rather than reclaimed",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for more jobs",
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:
+        stop = threading.Event()
+        concurrency = options["concurrency"]
+        self.stdout.write(f"Rendering jobs with a concurrency of {concurrency}")
+
+        with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            workers = [
+                executor.submit(
+                    self.drain,
+                    stop,
+                    options["poll_interval"],
+                    options["burst"],
+                    datetime.timedelta(seconds=options["lease"]),
+                    options["max_attempts"],
+                )
+                for _ in range(concurrency)
+            ]
+            try:
+                for worker in futures.as_completed(workers):
+                    worker.result()
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping once the running jobs have finished")
+                stop.set()
+
+    def drain(
+        self,
+        stop: threading.Event,
+        poll_interval: float,
+        burst: bool,
+        lease: datetime.timedelta,
+        max_attempts: int,
+    ) -> None:
+        try:
+            while not stop.is_set():
+                job = jobs.claim_next(lease, max_attempts)
+                if job is None:
+                    if burst:
+                        return
+                    stop.wait(poll_interval)
+                    continue
+
+                jobs.run(job)
+                self.stdout.write(f"Job {job.pk} {job.status}")
+        finally:
+            connections.close_all()
@@ -0,0 +1,32 @@
+import typing
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from pod.printing import warmup
+
+
+class Command(BaseCommand):
+    help = "Load PDF templates and fonts, and render every PDF view once"
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument(
+            "--skip-views",
+            action="store_true",
+            help="Only load the templates in the PDF_WARMUP setting",
+        )
+
+    def handle(self, *args: typing.Any, **options: typing.Any) -> None:
+        config = warmup.get_config()
+        if options["skip_views"]:
+            config = {**config, "VIEWS": False}
+
+        results = warmup.warm_up(config)
+        for result in results:
+            status = "failed" if result.error else "ok"
+            self.stdout.write(
+                f"{result.name:<40} {result.duration * 1000:8.1f}ms  {status}"
+            )
+
+        failed = [result.name for result in results if result.error]
+        if failed:
+            raise CommandError(f"Failed to warm up {', '.join(failed)}")
@@ -0,0 +1,239 @@
+"""
+Memory tracking and governance for long-running rendering processes.
+
+Repeated renders grow a process's RSS: WeasyPrint layout trees, font caches and pydyf
+objects are freed lazily, if at all, and the shared font configurations, parsed
+stylesheets and warm Typst compilers are kept on purpose. Every render is wrapped in
+`track_render()`, which logs the RSS delta of the render at debug level on the `report`
+logger, and hands it to the governor configured with the `PDF_MEMORY` setting:
+
+    PDF_MEMORY = {
+        "MAX_RENDERS": None,  # act after this many renders, whatever the RSS
+        "MAX_RSS": 768 * 1024 * 1024,  # act once RSS grows past this, None for no limit
+        "ACTION": "clear_caches",  # or "recycle"
+        "COOLDOWN_RENDERS": 50,  # renders before MAX_RSS is checked again
+    }
+
+The `clear_caches` action drops the caches registered with `register_cache()` and runs
+the garbage collector, then starts counting renders again. Those caches include the
+shared font configurations, parsed stylesheets and warm Typst compilers, which are
+rebuilt by the next renders, so `MAX_RENDERS` is opt-in: it acts however small the
+process is. The `recycle` action sends the process `SIGTERM`, which gunicorn, uvicorn's
+`--workers` supervisor and most container runtimes treat as a request to finish the
+current requests, exit, and start a replacement; only use it under such a supervisor.
+Render farm workers are recycled by the farm itself and do not use the governor.
+
+The delta of a render is only exact when it is the only render running in the process.
+"""
+
+import contextlib
+import ctypes
+import ctypes.util
+import functools
+import gc
+import logging
+import os
+import signal
+import sys
+import threading
+import typing
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore[assignment]
+
+logger = logging.getLogger("report")
+
+ACTIONS = frozenset({"clear_caches", "recycle"})
+
+_caches: list[typing.Callable[[], None]] = []
+_disabled = contextlib.nullcontext()
+_governed = True
+
+
+def get_rss() -> int | None:
+    """
+    Return the resident set size of the current process in bytes.
+
+    Uses the current RSS where the platform exposes it (Linux), falling back to the peak
+    RSS, and returns `None` where neither is available.
+    """
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes everywhere else
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def register_cache(clear: typing.Callable[[], None]) -> None:
+    """
+    Register a function that empties an internal cache, called by `clear_caches()`.
+    """
+    _caches.append(clear)
+
+
+def clear_caches() -> None:
+    """
+    Empty the registered caches and return the freed memory to the operating system.
+    """
+    for clear in _caches:
+        try:
+            clear()
+        except Exception:
+            logger.exception("Failed to clear PDF rendering cache %r", clear)
+    gc.collect()
+    _trim_heap()
+
+
+def _trim_heap() -> None:
+    # glibc keeps freed memory in its arenas, so RSS only drops once they are trimmed
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        libc.malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class MemoryGovernor:
+    """
+    Counts renders and watches the process RSS, acting once either passes its limit.
+    """
+
+    def __init__(
+        self,
+        max_renders: int | None = None,
+        max_rss: int | None = None,
+        action: str = "clear_caches",
+        cooldown_renders: int = 50,
+    ) -> None:
+        if action not in ACTIONS:
+            raise ImproperlyConfigured(
+                f"Unknown PDF_MEMORY action {action!r}, "
+                f"expected one of: {', '.join(sorted(ACTIONS))}"
+            )
+        self.max_renders = max_renders
+        self.max_rss = max_rss
+        self.action = action
+        self.cooldown_renders = cooldown_renders
+
+        self.renders = 0
+        self.recycling = False
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def track(self, label: str) -> typing.Iterator[None]:
+        before = get_rss()
+        try:
+            yield
+        finally:
+            after = get_rss()
+            self.rendered(label, before, after)
+
+    def rendered(self, label: str, before: int | None, after: int | None) -> None:
+        delta = after - before if after is not None and before is not None else None
+        if delta is not None:
+            logger.debug(
+                "Rendered %s: RSS %d bytes (%+d)",
+                label,
+                after,
+                delta,
+                extra={"pdf_label": label, "pdf_rss": after, "pdf_rss_delta": delta},
+            )
+
+        with self._lock:
+            self.renders += 1
+            reason = self.get_reason(after)
+            if reason is None or self.recycling:
+                return
+            renders, self.renders = self.renders, 0
+            self.recycling = self.action == "recycle"
+
+        if self.action == "recycle":
+            self.recycle(reason, renders, after)
+        else:
+            self.clear_caches(reason, renders, after)
+
+    def get_reason(self, rss: int | None) -> str | None:
+        if self.max_renders is not None and self.renders >= self.max_renders:
+            return f"{self.renders} renders"
+        if (
+            self.max_rss is not None
+            and rss is not None
+            and rss > self.max_rss
+            and self.renders >= self.cooldown_renders
+        ):
+            return f"RSS of {rss} bytes"
+        return None
+
+    def clear_caches(self, reason: str, renders: int, rss: int | None) -> None:
+        clear_caches()
+        after = get_rss()
+        logger.info(
+            "Cleared PDF rendering caches after %s: RSS %s -> %s bytes",
+            reason,
+            rss,
+            after,
+            extra={"pdf_renders": renders, "pdf_rss": after, "pdf_rss_before": rss},
+        )
+        if self.max_rss is not None and after is not None and after > self.max_rss:
+            logger.warning(
+                "RSS of %d bytes is still above PDF_MEMORY's MAX_RSS after clearing "
+                "caches",
+                after,
+                extra={"pdf_rss": after},
+            )
+
+    def recycle(self, reason: str, renders: int, rss: int | None) -> None:
+        logger.warning(
+            "Recycling process %d after %s",
+            os.getpid(),
+            reason,
+            extra={"pdf_renders": renders, "pdf_rss": rss},
+        )
+        os.kill(os.getpid(), signal.SIGTERM)
+
+
+@functools.lru_cache(maxsize=1)
+def get_governor() -> MemoryGovernor | None:
+    """
+    Return the process-wide memory governor, or `None` if `PDF_MEMORY` is not set.
+    """
+    config = getattr(settings, "PDF_MEMORY", None)
+    if config is None:
+        return None
+    return MemoryGovernor(
+        max_renders=config.get("MAX_RENDERS"),
+        max_rss=config.get("MAX_RSS"),
+        action=config.get("ACTION", "clear_caches"),
+        cooldown_renders=config.get("COOLDOWN_RENDERS", 50),
+    )
+
+
+def disable_governor() -> None:
+    """
+    Stop governing this process, for processes that are recycled some other way.
+    """
+    global _governed
+    _governed = False
+
+
+def track_render(label: str) -> typing.ContextManager[None]:
+    """
+    Track the memory used by the render in the enclosed block.
+    """
+    governor = get_governor() if _governed else None
+    if governor is None:
+        return _disabled
+    return governor.track(label)
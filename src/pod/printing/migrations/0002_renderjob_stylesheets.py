@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("printing", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="renderjob",
+            name="stylesheets",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
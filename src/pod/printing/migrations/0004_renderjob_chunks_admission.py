@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("printing", "0003_renderjob_pdf_options"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="renderjob",
+            name="admission",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name="renderjob",
+            name="chunk_rows",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="renderjob",
+            name="rows_per_chunk",
+            field=models.PositiveIntegerField(default=500),
+        ),
+    ]
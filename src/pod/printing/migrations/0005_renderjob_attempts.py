@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("printing", "0004_renderjob_chunks_admission"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="renderjob",
+            name="attempts",
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,79 @@
+import datetime
+import uuid
+
+from django.db import models
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+
+from . import generation
+
+
+class RenderJobQuerySet(models.QuerySet["RenderJob"]):
+    def pending(self) -> "RenderJobQuerySet":
+        return self.filter(status=RenderJob.Status.PENDING)
+
+    def expired(self, lease: datetime.timedelta) -> "RenderJobQuerySet":
+        """
+        Running jobs claimed longer than `lease` ago, whose worker is presumed dead.
+        """
+        return self.filter(
+            status=RenderJob.Status.RUNNING, started_at__lt=timezone.now() - lease
+        )
+
+    def claimable(self, lease: datetime.timedelta) -> "RenderJobQuerySet":
+        return self.filter(
+            Q(status=RenderJob.Status.PENDING)
+            | Q(status=RenderJob.Status.RUNNING, started_at__lt=timezone.now() - lease)
+        )
+
+
+class RenderJob(models.Model):
+    """
+    A PDF render queued to run in the background by the `printing_worker` command.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    template_name = models.CharField(max_length=255)
+    using = models.CharField(max_length=100, blank=True)
+    context = models.JSONField(default=dict)
+    stylesheets = models.JSONField(default=list, blank=True)
+    pdf_options = models.JSONField(default=dict, blank=True)
+    filename = models.CharField(max_length=255, blank=True)
+    attachment = models.BooleanField(default=True)
+    # Large-document mode and admission, see generation.WeasyPrintPDFGenerator and the
+    # PDF_ADMISSION setting
+    chunk_rows = models.CharField(max_length=100, blank=True)
+    rows_per_chunk = models.PositiveIntegerField(
+        default=generation.DEFAULT_ROWS_PER_CHUNK
+    )
+    admission = models.CharField(max_length=100, null=True, blank=True)
+
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING, db_index=True
+    )
+    pdf = models.BinaryField(null=True, editable=False)
+    error = models.TextField(blank=True)
+    # The number of times a worker has claimed the job
+    attempts = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    objects = RenderJobQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["created_at"]
+
+    def __str__(self) -> str:
+        return f"{self.template_name} ({self.status})"
+
+    def get_absolute_url(self) -> str:
+        return reverse("printing:render-job", kwargs={"pk": self.pk})
@@ -0,0 +1,43 @@
+import contextlib
+import threading
+import typing
+
+T = typing.TypeVar("T")
+
+
+class ObjectPool(typing.Generic[T]):
+    """
+    A thread-safe pool of expensive-to-create, reusable objects.
+
+    Objects are only ever used by one thread at a time: `checkout()` hands out an idle
+    object, or creates a new one with `factory` when all of them are busy, and puts it
+    back once the `with` block exits. The pool grows to the peak number of concurrent
+    users and never shrinks on its own; call `clear()` to drop the idle objects.
+    """
+
+    def __init__(self, factory: typing.Callable[[], T]) -> None:
+        self.factory = factory
+        self._idle: list[T] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def checkout(self) -> typing.Iterator[T]:
+        """
+        Check out an object for the duration of the `with` block.
+        """
+        with self._lock:
+            obj = self._idle.pop() if self._idle else None
+        if obj is None:
+            obj = self.factory()
+        try:
+            yield obj
+        finally:
+            with self._lock:
+                self._idle.append(obj)
+
+    def clear(self) -> None:
+        """
+        Drop all idle objects so they can be garbage collected.
+        """
+        with self._lock:
+            self._idle.clear()
@@ -0,0 +1,532 @@
+"""
+Profiling selected and slow PDF renders.
+
+Every render is wrapped in `profile()`, which profiles it in one of two ways:
+
+- Renders for requests carrying a valid signed `X-PDF-Profile` header are profiled
+  with cProfile. Tokens for the header are made with
+  `manage.py printing_profiles --token` and expire after `TOKEN_MAX_AGE` seconds.
+  cProfile profiles every thread of the process, so these profiles also include
+  whatever else the process was doing at the time, and requested renders are profiled
+  one at a time.
+- Other renders are sampled: a background thread records the stack of each running
+  render every `SAMPLE_INTERVAL` seconds, and the samples of renders that take longer
+  than `SLOW_THRESHOLD` seconds are saved. Sampling costs far less than cProfile, so it
+  can stay on in production.
+
+Profiles are saved to `DIRECTORY` with a JSON file describing the render, including its
+template, duration and the size of its context, and only the newest `MAX_PROFILES` are
+kept. `manage.py printing_profiles` lists and summarises them. Profiling is configured
+with the `PDF_PROFILING` setting:
+
+    PDF_PROFILING = {
+        "DIRECTORY": BASE_DIR / "pdf-profiles",
+        "MAX_PROFILES": 100,  # older profiles are deleted
+        "HEADER": "X-PDF-Profile",  # None to never profile on request
+        "TOKEN_MAX_AGE": 24 * 60 * 60,
+        "SLOW_THRESHOLD": 5,  # seconds, None to never sample renders
+        "SAMPLE_INTERVAL": 0.01,
+    }
+
+`RenderProfilingMiddleware` checks the header and names the profiles saved for the
+request in an `X-PDF-Profiles` response header. Sampled profiles are saved as collapsed
+stacks, one line per distinct stack with its sample count, as read by flame graph
+tools. Renders on the render farm are sampled in the worker processes, but are never
+profiled on request.
+"""
+
+import collections
+import contextlib
+import contextvars
+import cProfile
+import datetime
+import functools
+import json
+import logging
+import os
+import pathlib
+import sys
+import threading
+import time
+import types
+import typing
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django import http
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger("report")
+
+DEFAULT_MAX_PROFILES = 100
+DEFAULT_HEADER = "X-PDF-Profile"
+DEFAULT_TOKEN_MAX_AGE = 24 * 60 * 60
+DEFAULT_SAMPLE_INTERVAL = 0.01
+RESPONSE_HEADER = "X-PDF-Profiles"
+SIGNING_SALT = "pod.printing.profiling"
+SIGNED_VALUE = "profile"
+
+# The names of the profiles saved for the current request, if it asked to be profiled
+_requested: contextvars.ContextVar[list[str] | None] = contextvars.ContextVar(
+    "pdf_profile_requested", default=None
+)
+_profiling: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "pdf_profiling", default=False
+)
+_disabled = contextlib.nullcontext()
+# Only one cProfile profiler can be active in a process at a time
+_cprofile_lock = threading.Lock()
+
+
+class ProfileStore:
+    """
+    A directory of profiles, each with a JSON file describing it, keeping only the
+    newest `max_profiles`.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike[str],
+        max_profiles: int = DEFAULT_MAX_PROFILES,
+    ) -> None:
+        self.directory = pathlib.Path(directory)
+        self.max_profiles = max_profiles
+
+    def save(
+        self,
+        suffix: str,
+        write: typing.Callable[[pathlib.Path], None],
+        metadata: typing.Mapping[str, typing.Any],
+    ) -> str:
+        """
+        Save a profile written by `write`, returning its name.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Names sort in the order the profiles were saved
+        now = datetime.datetime.now(datetime.UTC)
+        name = f"{now:%Y%m%d-%H%M%S-%f}-{os.getpid()}"
+        write(self.directory / f"{name}{suffix}")
+        self.get_metadata_path(name).write_text(
+            json.dumps(
+                {
+                    "name": name,
+                    "file": f"{name}{suffix}",
+                    "created": now.isoformat(),
+                    "pid": os.getpid(),
+                    **metadata,
+                },
+                indent=2,
+                default=str,
+            )
+        )
+        self.prune()
+        return name
+
+    def get_metadata_path(self, name: str) -> pathlib.Path:
+        return self.directory / f"{name}.json"
+
+    def get(self, name: str) -> dict[str, typing.Any] | None:
+        try:
+            return typing.cast(
+                dict[str, typing.Any],
+                json.loads(self.get_metadata_path(name).read_text()),
+            )
+        except (OSError, ValueError):
+            return None
+
+    def get_profiles(self) -> list[dict[str, typing.Any]]:
+        """
+        Return the description of every profile, newest first.
+        """
+        profiles = (self.get(name) for name in reversed(self.get_names()))
+        return [metadata for metadata in profiles if metadata is not None]
+
+    def get_names(self) -> list[str]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(path.stem for path in self.directory.glob("*.json"))
+
+    def get_path(self, metadata: typing.Mapping[str, typing.Any]) -> pathlib.Path:
+        return self.directory / str(metadata["file"])
+
+    def delete(self, name: str) -> None:
+        metadata = self.get(name)
+        if metadata is not None:
+            self.get_path(metadata).unlink(missing_ok=True)
+        self.get_metadata_path(name).unlink(missing_ok=True)
+
+    def prune(self) -> None:
+        names = self.get_names()
+        for name in names[: max(len(names) - self.max_profiles, 0)]:
+            self.delete(name)
+
+
+def collapse_stack(frame: types.FrameType | None) -> str:
+    """
+    Format a stack as a line of a collapsed stacks file, outermost frame first.
+    """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class StackSampler:
+    """
+    Periodically records the stacks of the threads that are rendering.
+
+    The sampling thread is started on the first render and sleeps while no render is
+    running.
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.reset()
+        # The sampling thread does not survive a fork, and may hold the lock as it does
+        os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self) -> None:
+        self._renders: dict[int, collections.Counter[str]] = {}
+        self._lock = threading.Lock()
+        self._rendering = threading.Condition(self._lock)
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> collections.Counter[str]:
+        """
+        Start sampling the current thread, returning the count of each distinct stack.
+        """
+        stacks: collections.Counter[str] = collections.Counter()
+        with self._lock:
+            self._renders[threading.get_ident()] = stacks
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.run, name="pdf-profile-sampler", daemon=True
+                )
+                self._thread.start()
+            self._rendering.notify()
+        return stacks
+
+    def stop(self) -> None:
+        with self._lock:
+            del self._renders[threading.get_ident()]
+
+    def run(self) -> None:
+        while True:
+            with self._lock:
+                while not self._renders:
+                    self._rendering.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, stacks in self._renders.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse_stack(frame)] += 1
+            del frames
+
+
+class Profiler:
+    """
+    Profiles renders requested by the current request with cProfile, and samples the
+    others, saving the samples of slow renders.
+    """
+
+    def __init__(
+        self,
+        store: ProfileStore,
+        slow_threshold: float | None = None,
+        sample_interval: float = DEFAULT_SAMPLE_INTERVAL,
+    ) -> None:
+        self.store = store
+        self.slow_threshold = slow_threshold
+        self.sampler = (
+            StackSampler(sample_interval) if slow_threshold is not None else None
+        )
+
+    def profile(
+        self, label: str, details: typing.Mapping[str, typing.Any]
+    ) -> typing.ContextManager[None]:
+        requested = _requested.get()
+        if requested is not None:
+            return self.profile_requested(label, details, requested)
+        if self.sampler is not None and self.slow_threshold is not None:
+            return self.sample(label, details, self.sampler, self.slow_threshold)
+        return _disabled
+
+    @contextlib.contextmanager
+    def profile_requested(
+        self, label: str, details: typing.Mapping[str, typing.Any], saved: list[str]
+    ) -> typing.Iterator[None]:
+        with _cprofile_lock:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiling tool, such as a debugger, is active in the process
+                logger.warning("Not profiling %s: another profiler is active", label)
+                yield
+                return
+
+            token = _profiling.set(True)
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                profiler.disable()
+                _profiling.reset(token)
+                name = self.save(
+                    label,
+                    details,
+                    trigger="request",
+                    duration=time.perf_counter() - start,
+                    suffix=".prof",
+                    write=lambda path: profiler.dump_stats(path),
+                    threads="all",
+                )
+                if name is not None:
+                    saved.append(name)
+
+    @contextlib.contextmanager
+    def sample(
+        self,
+        label: str,
+        details: typing.Mapping[str, typing.Any],
+        sampler: StackSampler,
+        slow_threshold: float,
+    ) -> typing.Iterator[None]:
+        stacks = sampler.start()
+        token = _profiling.set(True)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            _profiling.reset(token)
+            duration = time.perf_counter() - start
+            if duration >= slow_threshold and stacks:
+                name = self.save(
+                    label,
+                    details,
+                    trigger="slow",
+                    duration=duration,
+                    suffix=".folded",
+                    write=functools.partial(write_stacks, stacks=stacks),
+                    threads="render",
+                )
+                logger.warning(
+                    "Slow render of %s took %.2fs, profile %s",
+                    label,
+                    duration,
+                    name,
+                    extra={"pdf_label": label, "pdf_profile": name},
+                )
+
+    def save(
+        self,
+        label: str,
+        details: typing.Mapping[str, typing.Any],
+        trigger: str,
+        duration: float,
+        suffix: str,
+        write: typing.Callable[[pathlib.Path], None],
+        threads: str,
+    ) -> str | None:
+        """
+        Save a profile, noting whether it covers the threads of the whole process
+        (`"all"`) or only the rendering thread (`"render"`).
+        """
+        try:
+            name = self.store.save(
+                suffix,
+                write,
+                {
+                    "label": label,
+                    "trigger": trigger,
+                    "duration": duration,
+                    "threads": threads,
+                    "details": dict(details),
+                },
+            )
+        except OSError:
+            logger.exception("Failed to save the profile of %s", label)
+            return None
+        logger.info(
+            "Saved profile %s of %s",
+            name,
+            label,
+            extra={"pdf_label": label, "pdf_profile": name},
+        )
+        return name
+
+
+def write_stacks(path: pathlib.Path, stacks: typing.Mapping[str, int]) -> None:
+    """
+    Write sampled stacks as a collapsed stacks file.
+    """
+    path.write_text("".join(f"{stack} {count}\n" for stack, count in stacks.items()))
+
+
+def get_config() -> dict[str, typing.Any] | None:
+    config = getattr(settings, "PDF_PROFILING", None)
+    return dict(config) if config is not None else None
+
+
+@functools.lru_cache(maxsize=1)
+def get_profiler() -> Profiler | None:
+    """
+    Return the process-wide profiler, or `None` if `PDF_PROFILING` is not set.
+    """
+    config = get_config()
+    if config is None:
+        return None
+    return Profiler(
+        get_store(config),
+        slow_threshold=config.get("SLOW_THRESHOLD"),
+        sample_interval=config.get("SAMPLE_INTERVAL", DEFAULT_SAMPLE_INTERVAL),
+    )
+
+
+def get_store(config: typing.Mapping[str, typing.Any]) -> ProfileStore:
+    return ProfileStore(
+        config["DIRECTORY"], config.get("MAX_PROFILES", DEFAULT_MAX_PROFILES)
+    )
+
+
+def profile(
+    label: str, details: typing.Mapping[str, typing.Any] | None = None
+) -> typing.ContextManager[None]:
+    """
+    Profile the render in the enclosed block, if it is requested or turns out slow.
+
+    `details` describe the render in the saved profile. Renders within a render that is
+    already being profiled are part of its profile.
+    """
+    profiler = get_profiler()
+    if profiler is None or _profiling.get():
+        return _disabled
+    return profiler.profile(label, details or {})
+
+
+def describe_context(context: typing.Mapping[str, typing.Any]) -> dict[str, int]:
+    """
+    Return the size of a template context: its number of keys, and the total length of
+    its lists, tuples, sets and dicts.
+
+    Other iterables, such as querysets, are not counted, so as not to evaluate them.
+    """
+    return {
+        "context_keys": len(context),
+        "context_items": sum(
+            len(value)
+            for value in context.values()
+            if isinstance(value, list | tuple | set | frozenset | dict)
+        ),
+    }
+
+
+def make_token() -> str:
+    """
+    Return a value for the profiling header, valid for `TOKEN_MAX_AGE` seconds.
+    """
+    return signing.TimestampSigner(salt=SIGNING_SALT).sign(SIGNED_VALUE)
+
+
+def check_token(token: str, max_age: int = DEFAULT_TOKEN_MAX_AGE) -> bool:
+    try:
+        value = signing.TimestampSigner(salt=SIGNING_SALT).unsign(
+            token, max_age=max_age
+        )
+    except signing.BadSignature:
+        return False
+    return value == SIGNED_VALUE
+
+
+def summarise_samples(
+    path: str | os.PathLike[str],
+) -> tuple[int, list[tuple[str, int, int]]]:
+    """
+    Summarise a collapsed stacks file, returning the total number of samples and, for
+    each function, the samples it was running in and those spent in its own code.
+    """
+    total = 0
+    inclusive: collections.Counter[str] = collections.Counter()
+    own: collections.Counter[str] = collections.Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if not stack:
+                continue
+            n = int(count)
+            frames = stack.split(";")
+            total += n
+            own[frames[-1]] += n
+            # Count recursive functions once per sample
+            for function in set(frames):
+                inclusive[function] += n
+    return total, [
+        (function, inclusive[function], own[function])
+        for function in sorted(inclusive, key=lambda f: (-own[f], -inclusive[f]))
+    ]
+
+
+class RenderProfilingMiddleware:
+    """
+    Profiles the renders of requests carrying a valid profiling header.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: typing.Callable[..., typing.Any]) -> None:
+        config = get_config()
+        if config is None or config.get("HEADER", DEFAULT_HEADER) is None:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.header: str = config.get("HEADER", DEFAULT_HEADER)
+        self.max_age: int = config.get("TOKEN_MAX_AGE", DEFAULT_TOKEN_MAX_AGE)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: http.HttpRequest) -> typing.Any:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.is_requested(request):
+            return self.get_response(request)
+        saved: list[str] = []
+        token = _requested.set(saved)
+        try:
+            response = self.get_response(request)
+        finally:
+            _requested.reset(token)
+        return self.process_response(response, saved)
+
+    async def __acall__(self, request: http.HttpRequest) -> typing.Any:
+        if not self.is_requested(request):
+            return await self.get_response(request)
+        saved: list[str] = []
+        token = _requested.set(saved)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _requested.reset(token)
+        return self.process_response(response, saved)
+
+    def is_requested(self, request: http.HttpRequest) -> bool:
+        token = request.headers.get(self.header)
+        if not token:
+            return False
+        if not check_token(token, self.max_age):
+            logger.warning("Ignoring an invalid %s header on %s", self.header, request)
+            return False
+        return True
+
+    def process_response(
+        self, response: http.HttpResponseBase, saved: list[str]
+    ) -> http.HttpResponseBase:
+        if saved:
+            response.headers[RESPONSE_HEADER] = ", ".join(saved)
+        return response
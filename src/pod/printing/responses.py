@@ -1,15 +1,54 @@
+import datetime
+import io
+import itertools
 import typing
+import zipfile
 
 from django import http
 from django.core import exceptions
+from django.core.handlers.asgi import ASGIRequest
 from django.template import base as template_base
-from django.template import response
+from django.template import loader, response
+from django.utils import cache as cache_utils
+from django.utils import http as http_utils
 from django.views.generic import base
 
-from . import generation
+from . import admission, cache, farm, generation, streaming, timing
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a `Range` header for a single range of bytes, returning its first and last
+    byte positions within a document of `size` bytes.
+
+    Returns `None` for headers that should be ignored: malformed ones, other units and
+    multiple ranges. A range that cannot be satisfied has its first byte at or after
+    the end of the document.
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    first, separator, last = (part.strip() for part in ranges.partition("-"))
+    if not separator or not (first or last):
+        return None
+    try:
+        if not first:
+            # A suffix range, the last `last` bytes of the document
+            suffix = int(last)
+            return (max(size - suffix, 0) if suffix else size), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if last and end < start:
+        return None
+    return start, min(end, size - 1)
 
 
 class PDFTemplateResponse(response.TemplateResponse):
+    # Whether byte ranges are served when the document is cached
+    supports_ranges = True
+
     def __init__(
         self,
         request: http.HttpRequest,
@@ -21,6 +60,14 @@ class PDFTemplateResponse(response.TemplateResponse):
         using: str | None = None,
         filename: str | None = None,
         attachment: bool = True,
+        pdf_cache: str | None = None,
+        render_farm: bool = True,
+        stylesheets: typing.Sequence[str] = (),
+        pdf_options: typing.Mapping[str, typing.Any] | None = None,
+        admission: str | None = "weasyprint",
+        chunk_rows: str | None = None,
+        rows_per_chunk: int = generation.DEFAULT_ROWS_PER_CHUNK,
+        pdf_cache_version: str | int | None = None,
     ) -> None:
         super().__init__(
             request=request,
@@ -32,11 +79,31 @@ class PDFTemplateResponse(response.TemplateResponse):
             using=using,
         )
         self.filename = filename
+        self.pdf_cache = pdf_cache
+        self.render_farm = render_farm
+        self.stylesheets = stylesheets
+        self.pdf_options = pdf_options
+        self.admission = admission
+        self.chunk_rows = chunk_rows
+        self.rows_per_chunk = rows_per_chunk
+        self.pdf_cache_version = pdf_cache_version
 
         if filename:
             display = "attachment" if attachment else "inline"
             self.headers["Content-Disposition"] = f'{display};filename="{filename}"'
 
+        # Ranges are only served from cached documents, so that a viewer fetching a
+        # document in parts does not render it for every part.
+        if self.supports_ranges and pdf_cache:
+            self.headers["Accept-Ranges"] = "bytes"
+            self.add_post_render_callback(PDFTemplateResponse.apply_range)
+
+    def resolve_template(
+        self, template: typing.Sequence[str] | template_base.Template | str
+    ) -> template_base.Template:
+        with timing.stage("resolve_template"):
+            return super().resolve_template(template)
+
     @property
     def rendered_content(self) -> bytes:  # type: ignore[override]
         """
@@ -44,18 +111,293 @@ class PDFTemplateResponse(response.TemplateResponse):
         """
         template = self.resolve_template(self.template_name)
         context = self.resolve_context(self.context_data)
+
+        pdf_cache = cache.caches[self.pdf_cache] if self.pdf_cache else None
+        key = (
+            self.make_render_key(template, context)
+            if cache.wants_key(pdf_cache)
+            else None
+        )
+        return cache.cached_render(
+            pdf_cache, key, lambda: self.admit_and_render_pdf(template, context)
+        )
+
+    def make_render_key(
+        self,
+        template: template_base.Template,
+        context: dict[str, typing.Any] | None,
+    ) -> str | None:
+        options: dict[str, typing.Any] = {
+            "stylesheets": generation.get_stylesheet_versions(
+                template, self.stylesheets
+            ),
+            "pdf_options": self.pdf_options,
+        }
+        if self.pdf_cache_version is not None:
+            options["version"] = self.pdf_cache_version
+        return cache.make_template_key(template, context or {}, options)
+
+    def get_render_key(self) -> str | None:
+        """
+        Return the key identifying this render, without rendering the document.
+
+        The key is a hash of the template, its source, the context, the options and the
+        cache version, or `None` if the context cannot be serialized.
+        """
+        return self.make_render_key(
+            self.resolve_template(self.template_name),
+            self.resolve_context(self.context_data),
+        )
+
+    def apply_range(self) -> None:
+        """
+        Cut the rendered document down to the byte range requested, if any.
+        """
+        request = self._request
+        header = request.headers.get("Range")
+        if not header or request.method != "GET" or self.status_code != 200:
+            return
+        # Serve the whole document if the client's copy is out of date
+        if_range = request.headers.get("If-Range")
+        if if_range and if_range not in (
+            self.headers.get("ETag"),
+            self.headers.get("Last-Modified"),
+        ):
+            return
+
+        content = self.content
+        byte_range = parse_range(header, len(content))
+        if byte_range is None:
+            return
+        first, last = byte_range
+        if first >= len(content):
+            self.status_code = 416
+            self.headers["Content-Range"] = f"bytes */{len(content)}"
+            self.content = b""
+            return
+        self.status_code = 206
+        self.headers["Content-Range"] = f"bytes {first}-{last}/{len(content)}"
+        self.content = content[first : last + 1]
+
+    def admit_and_render_pdf(
+        self,
+        template: template_base.Template,
+        context: dict[str, typing.Any] | None,
+    ) -> bytes:
+        with admission.admit(self.admission):
+            return self.render_pdf(template, context)
+
+    def render_pdf(
+        self,
+        template: template_base.Template,
+        context: dict[str, typing.Any] | None,
+    ) -> bytes:
+        """
+        Render the template to a PDF, on the render farm if one is configured.
+        """
+        render_farm = farm.get_render_farm() if self.render_farm else None
+        template_name = template.origin.template_name
+        # Large documents are not sent to the farm, as their rows may be lazy
+        if (
+            render_farm is not None
+            and self.chunk_rows is None
+            and isinstance(template_name, str)
+        ):
+            with timing.stage("render_farm"):
+                return render_farm.render(
+                    template_name,
+                    context,
+                    using=self.using,
+                    stylesheets=self.stylesheets,
+                    pdf_options=self.pdf_options,
+                )
+
         generator = generation.WeasyPrintPDFGenerator(
             template=template,
             context=context,
+            stylesheets=self.stylesheets,
+            pdf_options=self.pdf_options,
+            chunk_rows=self.chunk_rows,
+            rows_per_chunk=self.rows_per_chunk,
         )
         return generator.get_pdf()
 
+    def write_pdf(self, target: typing.BinaryIO) -> None:
+        """
+        Writes the rendered PDF pages to a file-like object.
+
+        Without a cache or render farm the pages are written as WeasyPrint generates
+        them; otherwise the finished PDF is written in one go.
+        """
+        if self.pdf_cache or (
+            self.render_farm and self.chunk_rows is None and farm.get_render_farm()
+        ):
+            target.write(self.rendered_content)
+            return
+
+        generator = generation.WeasyPrintPDFGenerator(
+            template=self.resolve_template(self.template_name),
+            context=self.resolve_context(self.context_data),
+            stylesheets=self.stylesheets,
+            pdf_options=self.pdf_options,
+            chunk_rows=self.chunk_rows,
+            rows_per_chunk=self.rows_per_chunk,
+        )
+        with admission.admit(self.admission):
+            generator.write_pdf(target)
+
+    def as_streaming_response(self) -> "StreamingPDFResponse":
+        """
+        Return a response that streams this document to the client as it is written.
+        """
+        # Fail before the response starts if the template does not exist, or if the
+        # render would not be admitted
+        self.resolve_template(self.template_name)
+        admission.check(self.admission)
+        return StreamingPDFResponse(
+            self.write_pdf,
+            asynchronous=isinstance(self._request, ASGIRequest),
+            status=self.status_code,
+            headers=self.headers,
+        )
+
+
+class StreamingPDFResponse(http.StreamingHttpResponse):
+    """
+    Streams a document to the client in chunks while it is being written.
+
+    `write` is called on a background thread with a file-like object to write the
+    document to. Under ASGI the content is an async iterator, so the document is
+    streamed without Django having to buffer it first.
+    """
+
+    def __init__(
+        self,
+        write: typing.Callable[[typing.BinaryIO], None],
+        *args: typing.Any,
+        asynchronous: bool = False,
+        **kwargs: typing.Any,
+    ) -> None:
+        stream = streaming.WriterStream(write)
+        content = stream.__aiter__() if asynchronous else iter(stream)
+        super().__init__(content, *args, **kwargs)
+
+
+BulkMode = typing.Literal["merged", "zip"]
+
+
+class PDFBulkTemplateResponse(PDFTemplateResponse):
+    """
+    Renders every object in the context's `object_list` in one response.
+
+    In "merged" mode the template is rendered once per chunk of objects, with
+    `object_list` set to the chunk, and the pages of all chunks are joined into a single
+    PDF. In "zip" mode the template is rendered once per object, with `object` set to
+    the object and `object_list` to a list holding just that object, and every PDF is
+    added to a ZIP archive.
+    """
+
+    def __init__(
+        self,
+        *args: typing.Any,
+        mode: BulkMode = "merged",
+        chunk_size: int = 100,
+        object_filename: typing.Callable[[typing.Any], str] | None = None,
+        **kwargs: typing.Any,
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.object_filename = object_filename or (lambda obj: f"{obj.pk}.pdf")
+
+    # Bulk documents are not cached, so every range would render them again
+    supports_ranges = False
+
+    @property
+    def rendered_content(self) -> bytes:  # type: ignore[override]
+        buffer = io.BytesIO()
+        self.write_pdf(buffer)
+        return buffer.getvalue()
+
+    def write_pdf(self, target: typing.BinaryIO) -> None:
+        template = self.resolve_template(self.template_name)
+        context = self.resolve_context(self.context_data) or {}
+        chunks = generation.iter_chunks(context.get("object_list", []), self.chunk_size)
+
+        with admission.admit(self.admission):
+            if self.mode == "zip":
+                self.write_zip(target, template, context, chunks)
+            else:
+                self.write_merged(target, template, context, chunks)
+
+    def write_merged(
+        self,
+        target: typing.BinaryIO,
+        template: template_base.Template,
+        context: dict[str, typing.Any],
+        chunks: typing.Iterator[list[typing.Any]],
+    ) -> None:
+        # An empty list still renders the template once, rather than returning no PDF
+        first_chunk = next(chunks, [])
+        generation.write_merged_pdf(
+            (
+                generation.WeasyPrintPDFGenerator(
+                    template=template,
+                    context={**context, "object_list": chunk},
+                    stylesheets=self.stylesheets,
+                    pdf_options=self.pdf_options,
+                )
+                for chunk in itertools.chain([first_chunk], chunks)
+            ),
+            target,
+        )
+
+    def write_zip(
+        self,
+        target: typing.BinaryIO,
+        template: template_base.Template,
+        context: dict[str, typing.Any],
+        chunks: typing.Iterator[list[typing.Any]],
+    ) -> None:
+        # Each PDF is compressed into the archive as soon as it is rendered, so when
+        # streaming the client receives the archive one document at a time.
+        with zipfile.ZipFile(target, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for chunk in chunks:
+                for obj in chunk:
+                    generator = generation.WeasyPrintPDFGenerator(
+                        template=template,
+                        context={**context, "object": obj, "object_list": [obj]},
+                        stylesheets=self.stylesheets,
+                        pdf_options=self.pdf_options,
+                    )
+                    archive.writestr(self.object_filename(obj), generator.get_pdf())
+
 
 class PDFTemplateResponseMixin(base.TemplateResponseMixin):
     response_class = PDFTemplateResponse
     content_type = "application/pdf"
     pdf_attachment = True
     pdf_filename: str
+    pdf_cache: str | None = None
+    # Stylesheets parsed once and shared by every render, relative to the template
+    pdf_stylesheets: typing.Sequence[str] = ()
+    # WeasyPrint output options, see generation.PDF_OPTIONS
+    pdf_options: dict[str, typing.Any] | None = None
+    # Render on the render farm when the PDF_RENDER_FARM setting is configured
+    pdf_render_farm = True
+    # Stream the document to the client while it is being written
+    pdf_streaming = False
+    # Queue the render as a background job and respond with 202 Accepted
+    pdf_background = False
+    # The PDF_ADMISSION entry limiting concurrent renders, or None for no limit
+    pdf_admission: str | None = "weasyprint"
+    # Answer conditional requests with 304 Not Modified rather than rendering, using
+    # the validators from get_pdf_etag() and get_pdf_last_modified()
+    pdf_conditional = False
+    # The context variable holding the rows of a large document, which is then laid out
+    # pdf_rows_per_chunk rows at a time, see generation.WeasyPrintPDFGenerator
+    pdf_chunk_rows: str | None = None
+    pdf_rows_per_chunk = generation.DEFAULT_ROWS_PER_CHUNK
 
     def get_pdf_filename(self) -> str:
         """
@@ -68,16 +410,166 @@ class PDFTemplateResponseMixin(base.TemplateResponseMixin):
             )
         return self.pdf_filename
 
-    def render_to_response(
+    def get_pdf_cache(self) -> str | None:
+        """
+        Return the alias of the `PDF_CACHES` entry to cache rendered PDFs in.
+
+        Caching is disabled when this is `None`, which is the default.
+        """
+        return self.pdf_cache
+
+    def get_pdf_cache_version(self) -> str | int | None:
+        """
+        Return a version that is added to the keys of cached PDFs, or `None` for none.
+
+        Cache keys cover the context, including the fields of the model instances in
+        it, but not the rows a template reaches through their relations. A view whose
+        template follows relations returns something that changes with those rows,
+        e.g. the latest `updated_at` of an invoice's line items, so that editing them
+        does not serve a stale PDF.
+        """
+        return None
+
+    def get_pdf_stylesheets(self) -> typing.Sequence[str]:
+        """
+        Return the paths of the shared stylesheets to apply to the document.
+
+        Paths are relative to the template's directory. Unlike stylesheets linked from
+        the template, these are parsed once and reused until the file changes.
+        """
+        return self.pdf_stylesheets
+
+    def get_pdf_options(self) -> dict[str, typing.Any]:
+        """
+        Return the options passed to WeasyPrint when writing the PDF.
+
+        These control the size and variant of the output, e.g.
+        `{"optimize_images": True, "jpeg_quality": 80, "dpi": 150}`. See
+        `generation.PDF_OPTIONS` for the supported options.
+        """
+        return self.pdf_options or {}
+
+    def get_pdf_admission(self) -> str | None:
+        """
+        Return the `PDF_ADMISSION` entry that limits how many of these documents are
+        rendered at once, or `None` to render without a limit.
+        """
+        return self.pdf_admission
+
+    def get_pdf_etag(self, response: "PDFTemplateResponse") -> str | None:
+        """
+        Return the entity tag of the document, or `None` to send none.
+
+        Defaults to the response's render key, a hash of the template, its source, the
+        context and the options, which is computed without rendering.
+        """
+        return response.get_render_key()
+
+    def get_pdf_last_modified(self) -> datetime.datetime | None:
+        """
+        Return when the document's inputs last changed, or `None` if it is not known.
+        """
+        return None
+
+    def get_conditional_response(
+        self, response: "PDFTemplateResponse"
+    ) -> http.HttpResponseBase:
+        """
+        Add the validators to the response, and return `304 Not Modified` (or
+        `412 Precondition Failed`) instead if the request's preconditions say so.
+        """
+        etag = self.get_pdf_etag(response)
+        last_modified = self.get_pdf_last_modified()
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        if etag is not None:
+            etag = http_utils.quote_etag(etag)
+            response.headers["ETag"] = etag
+        if timestamp is not None:
+            response.headers["Last-Modified"] = http_utils.http_date(timestamp)
+        return (
+            cache_utils.get_conditional_response(
+                self.request, etag=etag, last_modified=timestamp, response=response
+            )
+            or response
+        )
+
+    def render_to_response(  # type: ignore[override]
         self, context: dict[str, typing.Any], **response_kwargs: typing.Any
-    ) -> http.HttpResponse:
+    ) -> http.HttpResponseBase:
         """
         Render the template and return a PDFTemplateResponse.
+
+        When `pdf_streaming` is set, a StreamingPDFResponse is returned instead. When
+        `pdf_background` is set, the render is queued and the job's URL returned. When
+        `pdf_conditional` is set, a request for a document the client already has is
+        answered with `304 Not Modified` without rendering it.
+        """
+        if self.pdf_background:
+            return self.enqueue_render_job(context)
+
+        response = self.get_pdf_response(context, **response_kwargs)
+        if not isinstance(response, PDFTemplateResponse):
+            return response
+        if self.pdf_conditional:
+            conditional = self.get_conditional_response(response)
+            if conditional is not response:
+                return conditional
+        if self.pdf_streaming:
+            return response.as_streaming_response()
+        return response
+
+    def get_pdf_response(
+        self, context: dict[str, typing.Any], **response_kwargs: typing.Any
+    ) -> http.HttpResponseBase:
+        """
+        Return the response that renders the document, ignoring `pdf_background`,
+        `pdf_conditional` and `pdf_streaming`.
         """
         response_kwargs.update(
             {
                 "attachment": self.pdf_attachment,
                 "filename": self.get_pdf_filename(),
+                "pdf_cache": self.get_pdf_cache(),
+                "render_farm": self.pdf_render_farm,
+                "stylesheets": self.get_pdf_stylesheets(),
+                "pdf_options": self.get_pdf_options(),
+                "admission": self.get_pdf_admission(),
+                "chunk_rows": self.pdf_chunk_rows,
+                "rows_per_chunk": self.pdf_rows_per_chunk,
+                "pdf_cache_version": self.get_pdf_cache_version(),
             }
         )
         return super().render_to_response(context, **response_kwargs)
+
+    def enqueue_render_job(self, context: dict[str, typing.Any]) -> http.HttpResponse:
+        """
+        Queue the render as a background job and return `202 Accepted`.
+
+        The response's `Location` header, and the `url` in its body, point at the job,
+        which serves the PDF once it has been rendered.
+        """
+        # Imported here as the models cannot be loaded before the app registry is ready
+        from . import jobs
+
+        template = loader.select_template(
+            self.get_template_names(), using=self.template_engine
+        )
+        job = jobs.enqueue(
+            template_name=str(template.origin.template_name),
+            context=context,
+            using=self.template_engine,
+            filename=self.get_pdf_filename(),
+            attachment=self.pdf_attachment,
+            stylesheets=self.get_pdf_stylesheets(),
+            pdf_options=self.get_pdf_options(),
+            chunk_rows=self.pdf_chunk_rows,
+            rows_per_chunk=self.pdf_rows_per_chunk,
+            admission=self.get_pdf_admission(),
+        )
+
+        url = self.request.build_absolute_uri(job.get_absolute_url())
+        response = http.JsonResponse(
+            {"id": str(job.pk), "status": job.status, "url": url}, status=202
+        )
+        response.headers["Location"] = url
+        return response
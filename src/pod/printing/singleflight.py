@@ -0,0 +1,181 @@
+"""
+Sharing a single render between identical concurrent requests.
+
+When many requests for the same document arrive at once, e.g. after a link goes out in
+an email, only the first renders it. The others wait for that render and are given the
+same PDF. Renders are identified by their cache key: the template and its source, the
+serialized context and the render options. Renders whose context cannot be serialized
+are never shared.
+
+Sharing is configured with the `PDF_SINGLE_FLIGHT` setting:
+
+    PDF_SINGLE_FLIGHT = {
+        "LOCK_DIRECTORY": BASE_DIR / "pdf-locks",  # None to share within a process only
+        "LOCK_TIMEOUT": 60,  # seconds to wait for another process before rendering
+    }
+
+With a `LOCK_DIRECTORY`, the process rendering a document also holds a lock file for
+it, and other processes wait for the lock and then look for the document in the PDF
+cache, so sharing across processes needs a cache with a `DIRECTORY` they all use.
+Lock files are removed once the render finishes; in the rare case that a process opens
+a lock file just as it is removed, the document is rendered twice, never wrongly.
+
+Renders within a `cache.bypass()` block are never shared.
+"""
+
+import contextlib
+import logging
+import os
+import pathlib
+import threading
+import time
+import typing
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None  # type: ignore[assignment]
+
+logger = logging.getLogger("report")
+
+DEFAULT_LOCK_TIMEOUT = 60
+# How often to retry a lock file held by another process
+LOCK_POLL_INTERVAL = 0.02
+
+
+class Flight:
+    """
+    A render in progress, and its outcome once finished.
+    """
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.pdf: bytes | None = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+    def wait(self) -> bytes:
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return typing.cast(bytes, self.pdf)
+
+
+_flights: dict[str, Flight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_config() -> dict[str, typing.Any] | None:
+    config = getattr(settings, "PDF_SINGLE_FLIGHT", None)
+    return dict(config) if config is not None else None
+
+
+def is_enabled() -> bool:
+    return getattr(settings, "PDF_SINGLE_FLIGHT", None) is not None
+
+
+def share(
+    key: str,
+    render: typing.Callable[[], bytes],
+    lookup: typing.Callable[[], bytes | None] | None = None,
+) -> bytes:
+    """
+    Return the PDF for `key`, joining a render of it that is already in progress.
+
+    `lookup` is called after waiting for another process's render, to fetch the PDF it
+    stored; the document is rendered if it returns `None`.
+    """
+    config = get_config()
+    if config is None:
+        return render()
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if flight is None:
+            flight = _flights[key] = Flight()
+        else:
+            flight.waiters += 1
+
+    if not leader:
+        logger.debug("Waiting for the in-flight render of %s", key)
+        return flight.wait()
+
+    try:
+        flight.pdf = render_once(key, render, lookup, config)
+        return flight.pdf
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+        if flight.waiters:
+            logger.info(
+                "Shared the render of %s with %d waiting requests",
+                key,
+                flight.waiters,
+                extra={"pdf_key": key, "pdf_waiters": flight.waiters},
+            )
+
+
+def render_once(
+    key: str,
+    render: typing.Callable[[], bytes],
+    lookup: typing.Callable[[], bytes | None] | None,
+    config: typing.Mapping[str, typing.Any],
+) -> bytes:
+    """
+    Render the document while holding its lock file, if locking across processes.
+    """
+    directory = config.get("LOCK_DIRECTORY")
+    if directory is None or fcntl is None:
+        return render()
+
+    path = pathlib.Path(directory) / key[:2] / f"{key}.lock"
+    timeout = config.get("LOCK_TIMEOUT", DEFAULT_LOCK_TIMEOUT)
+    with lock_file(path, timeout) as waited:
+        if waited and lookup is not None:
+            pdf = lookup()
+            if pdf is not None:
+                logger.debug("Shared the render of %s from another process", key)
+                return pdf
+        return render()
+
+
+@contextlib.contextmanager
+def lock_file(path: pathlib.Path, timeout: float) -> typing.Iterator[bool]:
+    """
+    Hold an exclusive lock on the file, yielding whether another process held it first.
+
+    After `timeout` seconds the block runs without the lock.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        waited = False
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                locked = True
+                break
+            except BlockingIOError:
+                waited = True
+                if time.monotonic() >= deadline:
+                    logger.warning("Timed out waiting for render lock %s", path)
+                    locked = False
+                    break
+                time.sleep(LOCK_POLL_INTERVAL)
+
+        try:
+            yield waited
+        finally:
+            if locked:
+                path.unlink(missing_ok=True)
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
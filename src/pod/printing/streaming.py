@@ -0,0 +1,162 @@
+import functools
+import queue
+import threading
+import typing
+from concurrent import futures
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_CHUNKS = 16
+# The most writers that run at once in a process; further streams wait for a thread
+MAX_WRITERS = 16
+# How often a consumer waiting for a chunk checks whether the stream was closed
+POLL_INTERVAL = 0.1
+
+_DONE = object()
+
+
+class StreamClosed(Exception):
+    """
+    The consumer of a stream went away before the writer finished.
+    """
+
+
+class _QueueWriter:
+    """
+    A write-only file-like object that hands what is written to a queue in chunks.
+    """
+
+    def __init__(
+        self,
+        chunks: queue.Queue[typing.Any],
+        closed: threading.Event,
+        chunk_size: int,
+    ) -> None:
+        self._chunks = chunks
+        self._closed = closed
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer.extend(data)
+        if len(self._buffer) >= self._chunk_size:
+            self.flush()
+        return len(data)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self.put(bytes(self._buffer))
+            self._buffer.clear()
+
+    def put(self, item: typing.Any) -> None:
+        # Block while the queue is full so a slow client pauses the writer, but give up
+        # once the consumer has gone away.
+        while True:
+            if self._closed.is_set():
+                raise StreamClosed()
+            try:
+                self._chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+
+@functools.lru_cache(maxsize=1)
+def get_writer_executor() -> futures.ThreadPoolExecutor:
+    """
+    Return the process-wide pool of threads that run the writers of streams.
+    """
+    return futures.ThreadPoolExecutor(
+        max_workers=MAX_WRITERS, thread_name_prefix="pdf-stream"
+    )
+
+
+class WriterStream:
+    """
+    Runs a writer on a background thread and streams what it writes in chunks.
+
+    `write` is called with a write-only file-like object. Writes are buffered into
+    chunks of at least `chunk_size` bytes and at most `max_chunks` chunks are queued, so
+    peak memory is bounded by the queue rather than the size of the document. The stream
+    can be consumed with either `for` or `async for`, and any exception raised by the
+    writer is re-raised in the consumer. Writers run on a pool of at most `MAX_WRITERS`
+    threads shared by every stream.
+    """
+
+    def __init__(
+        self,
+        write: typing.Callable[[typing.BinaryIO], None],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        max_chunks: int = DEFAULT_MAX_CHUNKS,
+    ) -> None:
+        self.write = write
+        self.chunk_size = chunk_size
+        self._chunks: queue.Queue[typing.Any] = queue.Queue(maxsize=max_chunks)
+        self._closed = threading.Event()
+        self._future: futures.Future[None] | None = None
+
+    def _run(self) -> None:
+        # The consumer may have gone away while the stream waited for a thread
+        if self._closed.is_set():
+            return
+        writer = _QueueWriter(self._chunks, self._closed, self.chunk_size)
+        try:
+            self.write(typing.cast(typing.BinaryIO, writer))
+            writer.flush()
+            writer.put(_DONE)
+        except StreamClosed:
+            pass
+        except Exception as e:
+            try:
+                writer.put(e)
+            except StreamClosed:
+                pass
+        finally:
+            # The writer may have used the database from this thread
+            connections.close_all()
+
+    def _start(self) -> None:
+        if self._future is None:
+            self._future = get_writer_executor().submit(self._run)
+
+    def _next(self) -> bytes | None:
+        # Wait in short steps, so a consumer thread is not left waiting forever when
+        # the stream is closed and the writer gives up without putting anything
+        while True:
+            if self._closed.is_set():
+                return None
+            try:
+                item = self._chunks.get(timeout=POLL_INTERVAL)
+                break
+            except queue.Empty:
+                continue
+        if item is _DONE:
+            return None
+        if isinstance(item, Exception):
+            raise item
+        return typing.cast(bytes, item)
+
+    def close(self) -> None:
+        """
+        Stop the writer if it is still running.
+        """
+        self._closed.set()
+
+    def __iter__(self) -> typing.Iterator[bytes]:
+        self._start()
+        try:
+            while (chunk := self._next()) is not None:
+                yield chunk
+        finally:
+            self.close()
+
+    async def __aiter__(self) -> typing.AsyncIterator[bytes]:
+        self._start()
+        next_chunk = sync_to_async(self._next, thread_sensitive=False)
+        try:
+            while (chunk := await next_chunk()) is not None:
+                yield chunk
+        finally:
+            self.close()
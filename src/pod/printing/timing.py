@@ -0,0 +1,186 @@
+"""
+Per-stage timing of PDF renders.
+
+The printing layer wraps each stage of a render in `stage()`: resolving the template,
+rendering it with Django, parsing the HTML, laying it out and writing the PDF for
+WeasyPrint, and encoding the context and compiling for Typst. Timings are only recorded
+while a `collect()` block is active, so outside of one a stage costs a single context
+variable lookup.
+
+`RenderTimingMiddleware` collects the timings of each request. It is configured with
+the `PDF_RENDER_TIMING` setting and removes itself from the middleware chain when that
+is not set:
+
+    PDF_RENDER_TIMING = {
+        "SERVER_TIMING": True,  # add a Server-Timing header to responses
+        "COLLECTORS": ["pod.printing.timing.log_timings"],
+    }
+
+A collector is any callable taking the request's label and its `Timings`, referenced
+by its import path. Documents rendered on the render farm are timed as a single
+`render_farm` stage, and streamed documents only include the stages run before the
+response starts.
+"""
+
+import contextlib
+import contextvars
+import logging
+import time
+import typing
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django import http
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger("report")
+
+Collector = typing.Callable[[str, "Timings"], None]
+
+_timings: contextvars.ContextVar["Timings | None"] = contextvars.ContextVar(
+    "pdf_render_timings", default=None
+)
+_disabled = contextlib.nullcontext()
+
+
+class Timings:
+    """
+    The stages timed while collecting, in the order they finished.
+    """
+
+    def __init__(self) -> None:
+        self.stages: list[tuple[str, float]] = []
+
+    def add(self, name: str, duration: float) -> None:
+        self.stages.append((name, duration))
+
+    def totals(self) -> dict[str, float]:
+        """
+        Return the total milliseconds spent in each stage.
+        """
+        totals: dict[str, float] = {}
+        for name, duration in self.stages:
+            totals[name] = totals.get(name, 0.0) + duration * 1000
+        return totals
+
+    def as_server_timing(self) -> str:
+        """
+        Format the totals as the value of a `Server-Timing` header.
+        """
+        return ", ".join(
+            f"{name};dur={duration:.2f}" for name, duration in self.totals().items()
+        )
+
+
+class _Stage:
+    __slots__ = ("timings", "name", "start")
+
+    def __init__(self, timings: Timings, name: str) -> None:
+        self.timings = timings
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.timings.add(self.name, time.perf_counter() - self.start)
+
+
+def stage(name: str) -> typing.ContextManager[None]:
+    """
+    Time the enclosed block as the named stage, if timings are being collected.
+    """
+    timings = _timings.get()
+    if timings is None:
+        return _disabled
+    return _Stage(timings, name)
+
+
+@contextlib.contextmanager
+def collect(
+    label: str, collectors: typing.Iterable[Collector] = ()
+) -> typing.Iterator[Timings]:
+    """
+    Record the stages run within the block, then pass them to the collectors.
+
+    Collecting inside another `collect()` block records into the outer timings.
+    """
+    outer = _timings.get()
+    if outer is not None:
+        yield outer
+        return
+
+    timings = Timings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+        if timings.stages:
+            for collector in collectors:
+                try:
+                    collector(label, timings)
+                except Exception:
+                    logger.exception("Render timing collector %r failed", collector)
+
+
+def log_timings(label: str, timings: Timings) -> None:
+    """
+    A collector that logs the stage totals to the `report` logger.
+
+    The totals are attached to the record as `pdf_timings` for structured handlers.
+    """
+    totals = timings.totals()
+    logger.info(
+        "Render timings for %s: %s",
+        label,
+        " ".join(f"{name}={duration:.2f}ms" for name, duration in totals.items()),
+        extra={"pdf_label": label, "pdf_timings": totals},
+    )
+
+
+def get_collectors(names: typing.Iterable[str]) -> list[Collector]:
+    return [typing.cast(Collector, import_string(name)) for name in names]
+
+
+class RenderTimingMiddleware:
+    """
+    Collects the render timings of each request.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: typing.Callable[..., typing.Any]) -> None:
+        config = getattr(settings, "PDF_RENDER_TIMING", None)
+        if config is None:
+            raise MiddlewareNotUsed()
+
+        self.get_response = get_response
+        self.server_timing: bool = config.get("SERVER_TIMING", True)
+        self.collectors = get_collectors(
+            config.get("COLLECTORS", ["pod.printing.timing.log_timings"])
+        )
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request: http.HttpRequest) -> typing.Any:
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with collect(request.path, self.collectors) as timings:
+            response = self.get_response(request)
+        return self.process_response(response, timings)
+
+    async def __acall__(self, request: http.HttpRequest) -> typing.Any:
+        with collect(request.path, self.collectors) as timings:
+            response = await self.get_response(request)
+        return self.process_response(response, timings)
+
+    def process_response(
+        self, response: http.HttpResponseBase, timings: Timings
+    ) -> http.HttpResponseBase:
+        if self.server_timing and timings.stages:
+            response.headers["Server-Timing"] = timings.as_server_timing()
+        return response
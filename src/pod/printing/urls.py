@@ -0,0 +1,9 @@
+from django.urls import path
+
+from . import jobs
+
+app_name = "printing"
+
+urlpatterns = [
+    path("jobs/<uuid:pk>/", jobs.RenderJobView.as_view(), name="render-job"),
+]
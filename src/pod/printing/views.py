@@ -1,14 +1,85 @@
+import datetime
+import functools
 import typing
+from concurrent import futures
 
+from asgiref.sync import sync_to_async
 from django import http
+from django.conf import settings
+from django.core import exceptions
 from django.db import models
+from django.template import response as template_response
+from django.utils.translation import gettext as _
 from django.views.generic import base, detail
+from django.views.generic import list as list_views
 
 from . import responses
 
 ModelType = typing.TypeVar("ModelType", bound=models.Model)
 
 
+@functools.lru_cache(maxsize=1)
+def get_default_render_executor() -> futures.ThreadPoolExecutor:
+    """
+    Return the process-wide executor that async views render documents on.
+
+    The number of threads can be set with the `PDF_RENDER_MAX_WORKERS` setting, and
+    defaults to the `ThreadPoolExecutor` default.
+    """
+    return futures.ThreadPoolExecutor(
+        max_workers=getattr(settings, "PDF_RENDER_MAX_WORKERS", None),
+        thread_name_prefix="pdf-render",
+    )
+
+
+class AsyncRenderMixin:
+    """
+    Renders template responses on an executor so the event loop is never blocked.
+
+    Django's async handler would otherwise render the response in its single shared
+    sync thread, so that every render on the worker queues up behind the others.
+
+    Set `render_executor` or override `get_render_executor()` to render on a different
+    executor.
+    """
+
+    render_executor: futures.ThreadPoolExecutor | None = None
+
+    def get_render_executor(self) -> futures.ThreadPoolExecutor:
+        return self.render_executor or get_default_render_executor()
+
+    async def render_async(
+        self, response: http.HttpResponseBase
+    ) -> http.HttpResponseBase:
+        """
+        Render the response, if it needs rendering, on the render executor.
+        """
+        if isinstance(response, template_response.SimpleTemplateResponse):
+            await sync_to_async(
+                response.render,
+                thread_sensitive=False,
+                executor=self.get_render_executor(),
+            )()
+        return response
+
+    async def render_to_response_async(
+        self, context: dict[str, typing.Any]
+    ) -> http.HttpResponseBase:
+        """
+        Build the response and render it on the render executor.
+
+        Views with `pdf_background` queue their job off the event loop instead, as
+        queuing saves it to the database.
+        """
+        view: typing.Any = self
+        if getattr(view, "pdf_background", False):
+            return typing.cast(
+                http.HttpResponseBase,
+                await sync_to_async(view.enqueue_render_job)(context),
+            )
+        return await self.render_async(view.render_to_response(context))
+
+
 class PDFTemplateView(responses.PDFTemplateResponseMixin, base.ContextMixin, base.View):
     """
     Django class-based template view that renders to a PDF.
@@ -16,7 +87,7 @@ class PDFTemplateView(responses.PDFTemplateResponseMixin, base.ContextMixin, bas
 
     def get(
         self, request: http.HttpRequest, *args: typing.Any, **kwargs: typing.Any
-    ) -> http.HttpResponse:
+    ) -> http.HttpResponseBase:
         """
         Handle GET requests
         """
@@ -24,9 +95,27 @@ class PDFTemplateView(responses.PDFTemplateResponseMixin, base.ContextMixin, bas
         return self.render_to_response(context)
 
 
-class PDFDetailView(
-    responses.PDFTemplateResponseMixin, detail.BaseDetailView[ModelType]
-):
+class PDFObjectMixin(responses.PDFTemplateResponseMixin):
+    """
+    Validates conditional requests for a single object's PDF by when it was modified.
+
+    With `pdf_conditional` set, name the object's modification timestamp field with
+    `pdf_last_modified_field` to answer `If-Modified-Since` requests with `304 Not
+    Modified`.
+    """
+
+    pdf_last_modified_field: str | None = None
+
+    def get_pdf_last_modified(self) -> datetime.datetime | None:
+        if self.pdf_last_modified_field is None:
+            return None
+        obj = getattr(self, "object")  # noqa: B009 - set by the detail views
+        return typing.cast(
+            datetime.datetime | None, getattr(obj, self.pdf_last_modified_field)
+        )
+
+
+class PDFDetailView(PDFObjectMixin, detail.BaseDetailView[ModelType]):
     """
     Django class-based detail view that renders as a PDF.
 
@@ -38,4 +127,160 @@ class PDFDetailView(
 
     The name of the PDF file can be controlled with the `pdf_filename` attribute or by
     overriding the `get_pdf_filename` method.
+
+    Set `pdf_conditional` to answer requests for a PDF the client already has with
+    `304 Not Modified`, validated by a hash of the context or the object's
+    `pdf_last_modified_field`.
+    """
+
+
+class PDFListView(
+    responses.PDFTemplateResponseMixin,
+    list_views.MultipleObjectMixin[ModelType],
+    base.View,
+):
+    """
+    Django class-based list view that renders every object in the queryset as PDFs.
+
+    With `pdf_bulk_mode = "merged"` (the default) the result is a single PDF containing
+    all the objects. The template is rendered with `object_list` set to a chunk of up to
+    `pdf_chunk_size` objects at a time, and all chunks share one font configuration.
+
+    With `pdf_bulk_mode = "zip"` the result is a ZIP archive holding one PDF per object,
+    named by `get_pdf_object_filename()`. The template is rendered with `object` set to
+    each object in turn.
+
+    The queryset is streamed from the database in chunks so memory use does not grow
+    with its size. Templates should iterate over `object_list` rather than the
+    `<model>_list` context variable, which always holds the whole queryset.
+    """
+
+    response_class = responses.PDFBulkTemplateResponse
+    pdf_bulk_mode: responses.BulkMode = "merged"
+    pdf_chunk_size = 100
+
+    def get(
+        self, request: http.HttpRequest, *args: typing.Any, **kwargs: typing.Any
+    ) -> http.HttpResponseBase:
+        """
+        Handle GET requests
+        """
+        self.object_list = self.get_queryset()
+        context = self.get_context_data()
+        return self.render_to_response(context)
+
+    def get_pdf_object_filename(self, obj: ModelType) -> str:
+        """
+        Return the name of an object's PDF within the ZIP archive.
+        """
+        return f"{obj._meta.model_name}-{obj.pk}.pdf"
+
+    def render_to_response(  # type: ignore[override]
+        self, context: dict[str, typing.Any], **response_kwargs: typing.Any
+    ) -> http.HttpResponseBase:
+        response_kwargs.update(
+            {
+                "mode": self.pdf_bulk_mode,
+                "chunk_size": self.pdf_chunk_size,
+                "object_filename": self.get_pdf_object_filename,
+            }
+        )
+        if self.pdf_bulk_mode == "zip":
+            response_kwargs.setdefault("content_type", "application/zip")
+        return super().render_to_response(context, **response_kwargs)
+
+
+class AsyncTemplateView(
+    AsyncRenderMixin, base.TemplateResponseMixin, base.ContextMixin, base.View
+):
+    """
+    An async version of Django's `TemplateView` that renders off the event loop.
+
+    Useful with the Typst template engine, whose `typst.compile` would otherwise block
+    the worker for the duration of the compile.
     """
+
+    async def get(
+        self, request: http.HttpRequest, *args: typing.Any, **kwargs: typing.Any
+    ) -> http.HttpResponseBase:
+        """
+        Handle GET requests
+        """
+        context = self.get_context_data(**kwargs)
+        return await self.render_to_response_async(context)
+
+
+class AsyncPDFTemplateView(
+    AsyncRenderMixin,
+    responses.PDFTemplateResponseMixin,
+    base.ContextMixin,
+    base.View,
+):
+    """
+    An async version of `PDFTemplateView` that renders the PDF off the event loop.
+    """
+
+    async def get(
+        self, request: http.HttpRequest, *args: typing.Any, **kwargs: typing.Any
+    ) -> http.HttpResponseBase:
+        """
+        Handle GET requests
+        """
+        context = self.get_context_data(**kwargs)
+        return await self.render_to_response_async(context)
+
+
+class AsyncPDFDetailView(
+    AsyncRenderMixin,
+    PDFObjectMixin,
+    detail.SingleObjectMixin[ModelType],
+    base.View,
+):
+    """
+    An async version of `PDFDetailView`.
+
+    The object is looked up with the async ORM and the PDF is rendered off the event
+    loop.
+    """
+
+    async def get(
+        self, request: http.HttpRequest, *args: typing.Any, **kwargs: typing.Any
+    ) -> http.HttpResponseBase:
+        """
+        Handle GET requests
+        """
+        self.object = await self.aget_object()
+        context = self.get_context_data(object=self.object)
+        return await self.render_to_response_async(context)
+
+    async def aget_object(
+        self, queryset: models.QuerySet[ModelType] | None = None
+    ) -> ModelType:
+        """
+        Async equivalent of `SingleObjectMixin.get_object()`.
+        """
+        if queryset is None:
+            queryset = self.get_queryset()
+
+        pk = self.kwargs.get(self.pk_url_kwarg)
+        slug = self.kwargs.get(self.slug_url_kwarg)
+        if pk is not None:
+            queryset = queryset.filter(pk=pk)
+
+        if slug is not None and (pk is None or self.query_pk_and_slug):
+            slug_field = self.get_slug_field()
+            queryset = queryset.filter(**{slug_field: slug})
+
+        if pk is None and slug is None:
+            raise AttributeError(
+                f"Generic detail view {self.__class__.__name__} must be called with "
+                "either an object pk or a slug in the URLconf."
+            )
+
+        try:
+            return await queryset.aget()
+        except exceptions.ObjectDoesNotExist:
+            raise http.Http404(
+                _("No %(verbose_name)s found matching the query")
+                % {"verbose_name": queryset.model._meta.verbose_name}
+            ) from None
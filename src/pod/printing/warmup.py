@@ -0,0 +1,194 @@
+"""
+Warming up a process before it serves its first PDF.
+
+The first render in a process pays for importing WeasyPrint and Typst, scanning fonts,
+loading templates and the first Typst compile. Warming up does that work ahead of time:
+it loads the configured templates, starts the render farm, and makes a throwaway
+request to every PDF view whose URL takes no arguments. Caches are bypassed, so the
+renders do the real work. Views rendering a queryset, such as `PDFListView`, are skipped
+unless `LIST_VIEWS` is set, as they would render every object on every startup.
+
+Run it with `manage.py warm_printing`, or on startup with the `PDF_WARMUP` setting:
+
+    PDF_WARMUP = {
+        "ON_STARTUP": True,  # warm up server processes from AppConfig.ready()
+        "VIEWS": True,  # render every PDF view without URL arguments
+        "LIST_VIEWS": False,  # include views rendering a whole queryset
+        "TEMPLATES": {  # templates to load, by engine alias
+            "typst": ["ticket/ticket.typ"],
+        },
+    }
+
+On startup, only server processes (runserver and the common WSGI/ASGI servers) warm
+up, so management commands, type checkers and test runners start as before.
+"""
+
+import dataclasses
+import functools
+import logging
+import os
+import pathlib
+import sys
+import time
+import traceback
+import typing
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django import urls
+from django.conf import settings
+from django.template import engines
+from django.test import RequestFactory
+from django.urls import resolvers
+from django.views.generic import list as generic_list
+
+from . import cache, farm, responses
+
+logger = logging.getLogger("report")
+
+# The programs that serve requests, and so warm up on startup
+SERVER_PROGRAMS = frozenset(
+    {"daphne", "granian", "gunicorn", "hypercorn", "uvicorn", "uwsgi"}
+)
+
+
+@dataclasses.dataclass
+class WarmupResult:
+    name: str
+    duration: float
+    error: str | None = None
+
+
+def get_config() -> dict[str, typing.Any]:
+    return dict(getattr(settings, "PDF_WARMUP", {}))
+
+
+def is_server_process() -> bool:
+    """
+    Return whether this process serves requests, whether the server was started as a
+    program or with `python -m`.
+
+    For `runserver` with the autoreloader, only the child process that serves requests
+    counts.
+    """
+    if not sys.argv:
+        return False
+    program = pathlib.Path(sys.argv[0]).name
+    if program in SERVER_PROGRAMS:
+        return True
+    # Servers run with `python -m`, where argv[0] is the path of their __main__ module
+    spec = getattr(sys.modules.get("__main__"), "__spec__", None)
+    if spec is not None and spec.name.partition(".")[0] in SERVER_PROGRAMS:
+        return True
+    if len(sys.argv) > 1 and sys.argv[1] == "runserver":
+        return os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+    return False
+
+
+def is_pdf_view(
+    view: typing.Callable[..., typing.Any], list_views: bool = False
+) -> bool:
+    view_class = getattr(view, "view_class", None)
+    if view_class is None:
+        return False
+    if not list_views and issubclass(view_class, generic_list.MultipleObjectMixin):
+        return False
+    if issubclass(view_class, responses.PDFTemplateResponseMixin):
+        # Requests to background views would queue a job rather than render
+        return not view_class.pdf_background
+    return getattr(view_class, "content_type", None) == "application/pdf"
+
+
+def iter_pdf_views(
+    patterns: typing.Sequence[typing.Any] | None = None,
+    prefix: str = "/",
+    list_views: bool = False,
+) -> typing.Iterator[tuple[str, typing.Callable[..., typing.Any]]]:
+    """
+    Yield the path and view of every PDF view whose URL takes no arguments.
+
+    Views rendering a queryset are only included with `list_views`.
+    """
+    if patterns is None:
+        patterns = urls.get_resolver().url_patterns
+
+    for pattern in patterns:
+        route = pattern.pattern
+        if not isinstance(route, resolvers.RoutePattern) or route.converters:
+            continue
+        path = prefix + str(route)
+        if isinstance(pattern, resolvers.URLResolver):
+            yield from iter_pdf_views(pattern.url_patterns, path, list_views)
+        elif is_pdf_view(pattern.callback, list_views):
+            yield path, pattern.callback
+
+
+def timed(name: str, warm: typing.Callable[[], object]) -> WarmupResult:
+    start = time.perf_counter()
+    try:
+        warm()
+    except Exception:
+        logger.exception("Failed to warm up %s", name)
+        return WarmupResult(name, time.perf_counter() - start, traceback.format_exc())
+
+    result = WarmupResult(name, time.perf_counter() - start)
+    logger.info("Warmed up %s in %.1fms", name, result.duration * 1000)
+    return result
+
+
+def warm_templates(
+    templates: typing.Mapping[str, typing.Sequence[str]],
+) -> list[WarmupResult]:
+    """
+    Load the templates, by engine alias.
+    """
+    return [
+        timed(
+            f"template {using}:{name}",
+            functools.partial(engines[using].get_template, name),
+        )
+        for using, names in templates.items()
+        for name in names
+    ]
+
+
+def warm_view(path: str, view: typing.Callable[..., typing.Any]) -> None:
+    """
+    Make a throwaway request to the view and render the response.
+    """
+    request = RequestFactory().get(path)
+    with cache.bypass():
+        if iscoroutinefunction(view):
+            response = async_to_sync(view)(request)
+        else:
+            response = view(request)
+        render = getattr(response, "render", None)
+        if render is not None:
+            render()
+
+
+def warm_views(list_views: bool = False) -> list[WarmupResult]:
+    return [
+        timed(f"view {path}", functools.partial(warm_view, path, view))
+        for path, view in iter_pdf_views(list_views=list_views)
+    ]
+
+
+def warm_up(
+    config: typing.Mapping[str, typing.Any] | None = None,
+) -> list[WarmupResult]:
+    """
+    Warm up this process, returning what was warmed and how long it took.
+    """
+    if config is None:
+        config = get_config()
+
+    results = warm_templates(config.get("TEMPLATES", {}))
+
+    render_farm = farm.get_render_farm()
+    if render_farm is not None:
+        results.append(timed("render farm", render_farm.start))
+
+    if config.get("VIEWS", True):
+        results.extend(warm_views(config.get("LIST_VIEWS", False)))
+
+    return results
@@ -31,9 +31,13 @@ INSTALLED_APPS = [
     # Third party
     # Local
     "pod.accounts",
+    "pod.printing",
 ]
 
 MIDDLEWARE = [
+    "pod.printing.timing.RenderTimingMiddleware",
+    "pod.printing.admission.RenderAdmissionMiddleware",
+    "pod.printing.profiling.RenderProfilingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -64,6 +68,11 @@ TEMPLATES = [
         "NAME": "typst",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": False,
+        "OPTIONS": {
+            "cache_templates": True,
+            "check_mtime": DEBUG,
+            "pdf_cache": "default",
+        },
     },
 ]
 
@@ -125,6 +134,73 @@ STATICFILES_DIRS = [BASE_DIR / "static"]
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# Rendered PDF caches
+# See pod.printing.cache for the available options
+PDF_CACHES = {
+    "default": {
+        "MAX_MEMORY_ITEMS": 128,
+        "MAX_MEMORY_BYTES": 64 * 1024 * 1024,
+        "DIRECTORY": BASE_DIR.parent.parent / "pdf-cache",
+        "MAX_DISK_BYTES": 1024 * 1024 * 1024,
+    }
+}
+
+# Serve document assets from memory, and never fetch them over the network
+# See pod.printing.assets for the available options
+PDF_ASSETS = {
+    "MAX_BYTES": 64 * 1024 * 1024,
+    "MMAP_THRESHOLD": 1024 * 1024,
+    "CHECK_MTIME": DEBUG,
+}
+
+# Share one render between identical concurrent requests, across processes too
+# See pod.printing.singleflight for the available options
+PDF_SINGLE_FLIGHT = {
+    "LOCK_DIRECTORY": BASE_DIR.parent.parent / "pdf-cache" / "locks",
+    "LOCK_TIMEOUT": 60,
+}
+
+# Warm up templates, fonts and PDF views when a server process starts
+# See pod.printing.warmup for the available options
+PDF_WARMUP = {
+    "ON_STARTUP": True,
+    "VIEWS": True,
+}
+
+# Drop the rendering caches when the process grows too large
+# See pod.printing.memory for the available options
+PDF_MEMORY = {
+    "MAX_RSS": 768 * 1024 * 1024,
+    "ACTION": "clear_caches",
+}
+
+# Limit concurrent renders per engine, responding 503 once the wait queue is full
+# See pod.printing.admission for the available options
+PDF_ADMISSION = {
+    "weasyprint": {"MAX_CONCURRENT": 4, "MAX_QUEUE": 16, "TIMEOUT": 30},
+    "typst": {"MAX_CONCURRENT": 8, "MAX_QUEUE": 32, "TIMEOUT": 10},
+}
+
+# Profile renders on request with a signed header, and keep samples of slow renders
+# See pod.printing.profiling for the available options
+PDF_PROFILING = {
+    "DIRECTORY": BASE_DIR.parent.parent / "pdf-profiles",
+    "MAX_PROFILES": 100,
+    "HEADER": "X-PDF-Profile",
+    "SLOW_THRESHOLD": 5,
+}
+
+# Per-stage render timings, reported in a Server-Timing header and to the report logger
+# See pod.printing.timing for the available options
+PDF_RENDER_TIMING = (
+    {
+        "SERVER_TIMING": True,
+        "COLLECTORS": ["pod.printing.timing.log_timings"],
+    }
+    if DEBUG
+    else None
+)
+
 # Logging
 LOG_LEVEL = "INFO"
 LOGGING = {
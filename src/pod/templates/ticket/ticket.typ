@@ -1,23 +1,29 @@
-// Parse context or use defaults
-#let ctx = if ("context" in sys.inputs) {
-  json(bytes(sys.inputs.context))
+// Parse the contexts or use defaults. A batch render passes a list of contexts, and
+// every context is rendered on its own page.
+#let default = (
+  "name": "A Citizen",
+  "flight": "DL31",
+  "gate": "29",
+  "seat": "26E",
+  "zone": "4",
+  "date": "Sept 12, 2025",
+  "time": "5:10pm",
+  "barcode": "19780912",
+  "from": "MEL",
+  "to": "WLG",
+)
+#let contexts = if ("contexts" in sys.inputs) {
+  json(bytes(sys.inputs.contexts))
+} else if ("context" in sys.inputs) {
+  (json(bytes(sys.inputs.context)),)
 } else {
-  (
-    "name": "A Citizen",
-    "flight": "DL31",
-    "gate": "29",
-    "seat": "26E",
-    "zone": "4",
-    "date": "Sept 12, 2025",
-    "time": "5:10pm",
-    "barcode": "19780912",
-    "from": "MEL",
-    "to": "WLG",
-  )
+  (default,)
 }
 
 
-#set page(margin: 0.5cm, width: 20cm, height: 5.4cm)
+// Page numbers are not shown, but restart for every context so that a batch can be
+// split back into one document per context
+#set page(margin: 0.5cm, width: 20cm, height: 5.4cm, numbering: "1", footer: none)
 
 #set text(weight: 400, size: 10pt, fill: rgb("#2A3239"), font: "Barlow")
 #show heading: set text(font: "Barlow", weight: 700)
@@ -25,7 +31,7 @@
 #show heading.where(level: 2): set text(size: 14pt)
 #show heading.where(level: 3): set text(size: 10pt)
 
-#grid(
+#let ticket(ctx) = grid(
   columns: (1fr, 3cm),
   gutter: 4pt,
   [
@@ -84,3 +90,11 @@
     
   ]
 )
+
+#for (i, ctx) in contexts.enumerate() {
+  if i > 0 {
+    pagebreak()
+  }
+  counter(page).update(1)
+  ticket(ctx)
+}
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
 
 from pod.examples.views import InvoiceView, TicketView
 
@@ -7,4 +7,5 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     path("invoice/", InvoiceView.as_view()),
     path("ticket/", TicketView.as_view()),
+    path("printing/", include("pod.printing.urls")),
 ]
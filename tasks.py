@@ -124,7 +124,17 @@ def check_migrations(ctx):
         raise
 
 
-@invoke.task(typing, lint, check_migrations)
+@invoke.task
+def bench_imports(ctx, runs: int = 5):
+    """
+    Measure start-up time, and check the PDF libraries are imported lazily
+    """
+    _title("Benchmarking start-up imports")
+    with ctx.cd("src"):
+        ctx.run(f"uv run python -m benchmarks.imports --runs={runs}", pty=True)
+
+
+@invoke.task(typing, lint, check_migrations, bench_imports)
 def check(ctx):
     """
     Runs all the code checking tools
@@ -152,6 +162,78 @@ def build_presentation(ctx):
     )
 
 
+################
+# BENCHMARKING #
+################
+
+
+@invoke.task
+def bench(
+    ctx,
+    views: str = "invoice,ticket",
+    items: str = "1,10,100,1000,10000",
+    concurrency: str = "1,4",
+    renders: int = 10,
+    cold_runs: int = 3,
+    cache: bool = False,
+    output: str = "",
+):
+    """
+    Benchmark rendering the example views, reporting the results as JSON
+    """
+    _title("Benchmarking PDF rendering")
+    args = (
+        f" --views={views} --items={items} --concurrency={concurrency}"
+        f" --renders={renders} --cold-runs={cold_runs}"
+    )
+    if cache:
+        args += " --cache"
+    if output:
+        args += f" --output={pathlib.Path(output).absolute()}"
+    with ctx.cd("src"):
+        ctx.run(f"uv run python -m benchmarks.rendering{args}")
+
+
+@invoke.task
+def bench_fonts(ctx, renders: int = 20):
+    """
+    Measure the per-render saving of sharing WeasyPrint font configurations
+    """
+    _title("Benchmarking font configuration sharing")
+    with ctx.cd("src"):
+        ctx.run(f"uv run python -m benchmarks.fonts --renders={renders}", pty=True)
+
+
+@invoke.task
+def bench_load(
+    ctx,
+    servers: str = "asgi,wsgi",
+    concurrency: str = "1,4,16,64",
+    duration: float = 10.0,
+    workers: int = 1,
+    threads: int = 8,
+    paths: str = "",
+    cache: bool = False,
+    output: str = "",
+):
+    """
+    Load test the ASGI and WSGI servers, reporting the results as JSON
+    """
+    _title("Load testing the ASGI and WSGI servers")
+    args = (
+        f" --servers={servers} --concurrency={concurrency} --duration={duration}"
+        f" --workers={workers} --threads={threads}"
+    )
+    if paths:
+        args += f" --paths={paths}"
+    if cache:
+        args += " --cache"
+    if output:
+        args += f" --output={pathlib.Path(output).absolute()}"
+    with ctx.cd("src"):
+        ctx.run(f"uv run python -m benchmarks.load{args}")
+
+
 ###########
 # HELPERS #
 ###########